@@ -1,14 +1,20 @@
-DROP TABLE IF EXISTS judgment_principles;
-DROP TABLE IF EXISTS judgments;
-DROP TABLE IF EXISTS fatwa_principles;
-DROP TABLE IF EXISTS fatwas;
-DROP TABLE IF EXISTS law_articles;
-DROP TABLE IF EXISTS law_promulgation_articles;
-DROP TABLE IF EXISTS laws;
+-- Judgments and fatwas are partitioned by the decade of their date (`decade`, e.g. 1990 for
+-- 1990-1999, 0 when the date is unknown), their principles/citations carry the decade of their
+-- document and are partitioned the same way. Partitions (judgments_1990s, ...) are created by
+-- ingestion when a new decade shows up (ingest.create_partitions).
+-- Databases created before the partitioning still have plain tables: these are dropped,
+-- ingestion then stores the documents again into the partitioned tables
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = to_regclass('judgments')) = 'r' THEN
+        DROP TABLE IF EXISTS judgment_principles, judgments, fatwa_principles, fatwas;
+    END IF;
+END $$;
 
 -- Judgments
-CREATE TABLE judgments (
-    id SERIAL PRIMARY KEY,
+CREATE TABLE IF NOT EXISTS judgments (
+    id SERIAL,
+    decade INT NOT NULL,
     file_name VARCHAR(255) NOT NULL,
     court_name VARCHAR(255),
     chamber_type VARCHAR(255),
@@ -22,20 +28,28 @@ CREATE TABLE judgments (
     reference_number INT,
     authority TEXT,
     facts TEXT,
-    reasons TEXT
-);
+    reasons TEXT,
+    search_vector TSVECTOR,
+    search_norm TEXT,
+    PRIMARY KEY (id, decade)
+) PARTITION BY RANGE (decade);
 
-CREATE TABLE judgment_principles (
-    id SERIAL PRIMARY KEY,
-    judgment_id INT REFERENCES judgments(id) ON DELETE CASCADE,
+CREATE TABLE IF NOT EXISTS judgment_principles (
+    id SERIAL,
+    judgment_id INT,
+    decade INT NOT NULL,
     principle_number INT NOT NULL,
     content TEXT NOT NULL,
-    UNIQUE(judgment_id, principle_number)
-);
+    search_norm TEXT,
+    PRIMARY KEY (id, decade),
+    FOREIGN KEY (judgment_id, decade) REFERENCES judgments(id, decade) ON DELETE CASCADE,
+    UNIQUE(judgment_id, decade, principle_number)
+) PARTITION BY RANGE (decade);
 
 -- Fatwas
-CREATE TABLE fatwas (
-    id SERIAL PRIMARY KEY,
+CREATE TABLE IF NOT EXISTS fatwas (
+    id SERIAL,
+    decade INT NOT NULL,
     file_name VARCHAR(255) NOT NULL,
     fatwa_number INT,
     fatwa_date DATE,
@@ -45,19 +59,26 @@ CREATE TABLE fatwas (
     topic TEXT,
     facts TEXT,
     application TEXT,
-    opinion TEXT
-);
+    opinion TEXT,
+    search_vector TSVECTOR,
+    search_norm TEXT,
+    PRIMARY KEY (id, decade)
+) PARTITION BY RANGE (decade);
 
-CREATE TABLE fatwa_principles (
-    id SERIAL PRIMARY KEY,
-    fatwa_id INT REFERENCES fatwas(id) ON DELETE CASCADE,
+CREATE TABLE IF NOT EXISTS fatwa_principles (
+    id SERIAL,
+    fatwa_id INT,
+    decade INT NOT NULL,
     principle_number INT NOT NULL,
     content TEXT NOT NULL,
-    UNIQUE(fatwa_id, principle_number)
-);
+    search_norm TEXT,
+    PRIMARY KEY (id, decade),
+    FOREIGN KEY (fatwa_id, decade) REFERENCES fatwas(id, decade) ON DELETE CASCADE,
+    UNIQUE(fatwa_id, decade, principle_number)
+) PARTITION BY RANGE (decade);
 
 -- Laws
-CREATE TABLE laws (
+CREATE TABLE IF NOT EXISTS laws (
     id SERIAL PRIMARY KEY,
     file_name VARCHAR(255) NOT NULL,
     law_number INT,
@@ -67,7 +88,7 @@ CREATE TABLE laws (
     gazette VARCHAR(255)
 );
 
-CREATE TABLE law_articles (
+CREATE TABLE IF NOT EXISTS law_articles (
     id SERIAL PRIMARY KEY,
     law_id INT REFERENCES laws(id) ON DELETE CASCADE,
     article_number INT NOT NULL,
@@ -78,7 +99,7 @@ CREATE TABLE law_articles (
     UNIQUE(law_id, article_number, is_repeated)
 );
 
-CREATE TABLE law_promulgation_articles (
+CREATE TABLE IF NOT EXISTS law_promulgation_articles (
     id SERIAL PRIMARY KEY,
     law_id INT REFERENCES laws(id) ON DELETE CASCADE,
     article_number INT NOT NULL,
@@ -88,15 +109,236 @@ CREATE TABLE law_promulgation_articles (
     UNIQUE(law_id, article_number)
 );
 
+-- Law articles cited by judgments/fatwas (document_parser.extract_citations)
+-- the cited law is either law_number + law_year or the canonical law_name of a well-known code
+CREATE TABLE IF NOT EXISTS judgment_citations (
+    id SERIAL,
+    judgment_id INT,
+    decade INT NOT NULL,
+    article_number INT NOT NULL,
+    paragraph INT,
+    is_repeated BOOLEAN NOT NULL DEFAULT FALSE,
+    law_number INT,
+    law_year INT,
+    law_name TEXT,
+    citation_text TEXT,
+    PRIMARY KEY (id, decade),
+    FOREIGN KEY (judgment_id, decade) REFERENCES judgments(id, decade) ON DELETE CASCADE,
+    UNIQUE NULLS NOT DISTINCT (judgment_id, decade, article_number, paragraph, is_repeated, law_number, law_year, law_name)
+) PARTITION BY RANGE (decade);
+
+CREATE TABLE IF NOT EXISTS fatwa_citations (
+    id SERIAL,
+    fatwa_id INT,
+    decade INT NOT NULL,
+    article_number INT NOT NULL,
+    paragraph INT,
+    is_repeated BOOLEAN NOT NULL DEFAULT FALSE,
+    law_number INT,
+    law_year INT,
+    law_name TEXT,
+    citation_text TEXT,
+    PRIMARY KEY (id, decade),
+    FOREIGN KEY (fatwa_id, decade) REFERENCES fatwas(id, decade) ON DELETE CASCADE,
+    UNIQUE NULLS NOT DISTINCT (fatwa_id, decade, article_number, paragraph, is_repeated, law_number, law_year, law_name)
+) PARTITION BY RANGE (decade);
+
 -- Indices on foreign keys for joins
-CREATE INDEX idx_judgment_principles_judgment_id
+CREATE INDEX IF NOT EXISTS idx_judgment_principles_judgment_id
 ON judgment_principles(judgment_id);
 
-CREATE INDEX idx_fatwa_principles_fatwa_id
+CREATE INDEX IF NOT EXISTS idx_fatwa_principles_fatwa_id
 ON fatwa_principles(fatwa_id);
 
-CREATE INDEX idx_law_articles_law_id
+CREATE INDEX IF NOT EXISTS idx_law_articles_law_id
 ON law_articles(law_id);
 
-CREATE INDEX idx_law_promulgation_articles_law_id
-ON law_promulgation_articles(law_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_law_promulgation_articles_law_id
+ON law_promulgation_articles(law_id);
+
+CREATE INDEX IF NOT EXISTS idx_judgment_citations_judgment_id
+ON judgment_citations(judgment_id);
+
+CREATE INDEX IF NOT EXISTS idx_fatwa_citations_fatwa_id
+ON fatwa_citations(fatwa_id);
+
+-- cited-by lookups: by law number/year or by law name, then article
+CREATE INDEX IF NOT EXISTS idx_judgment_citations_law_number
+ON judgment_citations(law_number, article_number, law_year);
+
+CREATE INDEX IF NOT EXISTS idx_judgment_citations_law_name
+ON judgment_citations(law_name, article_number);
+
+CREATE INDEX IF NOT EXISTS idx_fatwa_citations_law_number
+ON fatwa_citations(law_number, article_number, law_year);
+
+CREATE INDEX IF NOT EXISTS idx_fatwa_citations_law_name
+ON fatwa_citations(law_name, article_number);
+
+-- Indices on file names, used to find/replace/delete the rows of one file
+CREATE INDEX IF NOT EXISTS idx_judgments_file_name
+ON judgments(file_name);
+
+CREATE INDEX IF NOT EXISTS idx_fatwas_file_name
+ON fatwas(file_name);
+
+CREATE INDEX IF NOT EXISTS idx_laws_file_name
+ON laws(file_name);
+
+-- Direct law/article lookups (/laws/{law_number}/...), articles are then found through
+-- the UNIQUE(law_id, article_number[, is_repeated]) indexes
+CREATE INDEX IF NOT EXISTS idx_laws_law_number
+ON laws(law_number);
+
+-- metadata filters (B-tree, equality + range scans)
+CREATE INDEX IF NOT EXISTS idx_judgments_chamber_year
+ON judgments(chamber_type, judicial_year);
+
+CREATE INDEX IF NOT EXISTS idx_judgments_court_name
+ON judgments(court_name);
+
+CREATE INDEX IF NOT EXISTS idx_judgments_appeal_number
+ON judgments(appeal_number);
+
+CREATE INDEX IF NOT EXISTS idx_judgments_judicial_year
+ON judgments(judicial_year);
+
+CREATE INDEX IF NOT EXISTS idx_judgments_hearing_date
+ON judgments(hearing_date);
+
+CREATE INDEX IF NOT EXISTS idx_fatwas_fatwa_number
+ON fatwas(fatwa_number);
+
+CREATE INDEX IF NOT EXISTS idx_fatwas_fatwa_date
+ON fatwas(fatwa_date);
+
+CREATE INDEX IF NOT EXISTS idx_fatwas_hearing_date
+ON fatwas(hearing_date);
+
+CREATE INDEX IF NOT EXISTS idx_laws_issue_date
+ON laws(issue_date);
+
+CREATE INDEX IF NOT EXISTS idx_laws_publish_date
+ON laws(publish_date);
+
+-- Full-text search: one weighted tsvector per document (principles/articles folded in),
+-- maintained by ingestion (ingest.ingest_batch), part of the judgments/fatwas tables above
+ALTER TABLE laws ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+
+CREATE INDEX IF NOT EXISTS idx_judgments_search_vector
+ON judgments USING GIN (search_vector);
+
+CREATE INDEX IF NOT EXISTS idx_fatwas_search_vector
+ON fatwas USING GIN (search_vector);
+
+CREATE INDEX IF NOT EXISTS idx_laws_search_vector
+ON laws USING GIN (search_vector);
+
+-- Arabic-normalized search text (document_parser.normalize_arabic), written once at ingest
+-- main tables: the searchable fields of the document, related tables: the principle/article text
+-- (judgments/fatwas and their principles have it from the start)
+ALTER TABLE laws ADD COLUMN IF NOT EXISTS search_norm TEXT;
+ALTER TABLE law_articles ADD COLUMN IF NOT EXISTS search_norm TEXT;
+ALTER TABLE law_promulgation_articles ADD COLUMN IF NOT EXISTS search_norm TEXT;
+
+-- rows stored before the search columns existed, removed and re-ingested on the next run
+CREATE INDEX IF NOT EXISTS idx_judgments_search_stale
+ON judgments(id) WHERE search_norm IS NULL OR search_vector IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_fatwas_search_stale
+ON fatwas(id) WHERE search_norm IS NULL OR search_vector IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_laws_search_stale
+ON laws(id) WHERE search_norm IS NULL OR search_vector IS NULL;
+
+-- Substring search (mode=substring): one trigram index per table on the normalized text,
+-- so ILIKE '%q%' is an index probe
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_judgments_search_norm_trgm
+ON judgments USING GIN (search_norm gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_fatwas_search_norm_trgm
+ON fatwas USING GIN (search_norm gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_laws_search_norm_trgm
+ON laws USING GIN (search_norm gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_judgment_principles_search_norm_trgm
+ON judgment_principles USING GIN (search_norm gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_fatwa_principles_search_norm_trgm
+ON fatwa_principles USING GIN (search_norm gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_law_articles_search_norm_trgm
+ON law_articles USING GIN (search_norm gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_law_promulgation_articles_search_norm_trgm
+ON law_promulgation_articles USING GIN (search_norm gin_trgm_ops);
+
+-- Ingestion manifest: one row per ingested file, so restarts only touch new/changed/removed files
+CREATE TABLE IF NOT EXISTS ingest_manifest (
+    doc_type VARCHAR(16) NOT NULL,
+    file_name VARCHAR(255) NOT NULL,
+    file_size BIGINT NOT NULL,
+    mtime DOUBLE PRECISION NOT NULL,
+    content_hash CHAR(64) NOT NULL,
+    parser_version INT NOT NULL, -- files ingested by another PARSER_VERSION are re-ingested
+    doc_id INT, -- main table row holding the document of the file (shared by duplicates of one key)
+    ingested_at TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (doc_type, file_name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_ingest_manifest_doc_id
+ON ingest_manifest(doc_type, doc_id);
+
+-- Unified search index: one row per document of any type (weighted search_vector copied from
+-- the main table, title/date for display), maintained by ingestion (ingest.index_documents)
+-- one (unique) FK per type so rows go away with their document, doc_id is the one that is set
+-- (judgments/fatwas are referenced together with their decade partition)
+CREATE TABLE IF NOT EXISTS search_index (
+    id SERIAL PRIMARY KEY,
+    doc_type VARCHAR(16) NOT NULL,
+    judgment_id INT UNIQUE,
+    fatwa_id INT UNIQUE,
+    law_id INT UNIQUE REFERENCES laws(id) ON DELETE CASCADE,
+    decade INT,
+    doc_id INT GENERATED ALWAYS AS (coalesce(judgment_id, fatwa_id, law_id)) STORED,
+    title TEXT,
+    doc_date DATE,
+    search_vector TSVECTOR NOT NULL,
+    FOREIGN KEY (judgment_id, decade) REFERENCES judgments(id, decade) ON DELETE CASCADE,
+    FOREIGN KEY (fatwa_id, decade) REFERENCES fatwas(id, decade) ON DELETE CASCADE,
+    CHECK (num_nonnulls(judgment_id, fatwa_id, law_id) = 1)
+);
+
+CREATE INDEX IF NOT EXISTS idx_search_index_search_vector
+ON search_index USING GIN (search_vector);
+
+-- Document snapshots: the assembled JSON of every document (exactly what /documents returns),
+-- written by ingestion (ingest.snapshot_documents) and served by /documents/{type}/{id} with one
+-- primary key lookup. json (not jsonb) keeps the text as written, so keys stay in document order.
+-- same per-type FKs as search_index, `version` is the ingest.SNAPSHOT_VERSION it was built with
+CREATE TABLE IF NOT EXISTS document_snapshots (
+    doc_type VARCHAR(16) NOT NULL,
+    judgment_id INT UNIQUE,
+    fatwa_id INT UNIQUE,
+    law_id INT UNIQUE REFERENCES laws(id) ON DELETE CASCADE,
+    decade INT,
+    doc_id INT GENERATED ALWAYS AS (coalesce(judgment_id, fatwa_id, law_id)) STORED,
+    version INT NOT NULL,
+    document JSON NOT NULL,
+    PRIMARY KEY (doc_type, doc_id),
+    FOREIGN KEY (judgment_id, decade) REFERENCES judgments(id, decade) ON DELETE CASCADE,
+    FOREIGN KEY (fatwa_id, decade) REFERENCES fatwas(id, decade) ON DELETE CASCADE,
+    CHECK (num_nonnulls(judgment_id, fatwa_id, law_id) = 1)
+);
+
+-- Corpus version: bumped by ingestion whenever stored documents change, API result caches
+-- are keyed by it (single row)
+CREATE TABLE IF NOT EXISTS corpus_version (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO corpus_version DEFAULT VALUES ON CONFLICT DO NOTHING;
@@ -0,0 +1,138 @@
+from psycopg_pool import AsyncConnectionPool
+from psycopg2 import pool as pg_pool
+from psycopg2 import extensions as pg_ext
+from contextlib import contextmanager
+import psycopg2 as pg
+import threading
+import os
+import time
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "5")) # connections kept open while idle (psycopg2 closes the extra ones on return)
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20")) # hard cap on concurrent connections from this process
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10")) # seconds to wait for a free connection
+DB_POOL_PING_AFTER = float(os.getenv("DB_POOL_PING_AFTER", "30")) # ping connections idle for longer than this
+
+_pool = None
+_async_pool = None
+_pool_slots = None # bounds checkouts so callers wait instead of getting PoolError
+_last_used = {} # id(conn) -> time it was returned to the pool
+
+def get_db_connection():
+    """
+    open a single (unpooled) connection, waiting for Postgres to come up
+    """
+    for attempt in range(100):
+        try:
+            conn = pg.connect(DATABASE_URL)
+            print("Connected to Postgres!")
+            return conn
+        except pg.OperationalError:
+            print(f"Postgres not ready yet, retrying...")
+            time.sleep(3)
+    raise Exception("Could not connect to Postgres after several retries.")
+
+def init_pool():
+    """
+    create the connection pool, called once at application startup
+    """
+    global _pool, _pool_slots
+    if _pool is not None:
+        return
+    get_db_connection().close() # wait until Postgres accepts connections
+    _pool = pg_pool.ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, DATABASE_URL)
+    _pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.closeall()
+        _pool = None
+        _last_used.clear()
+
+def _is_healthy(conn):
+    """
+    helper function to check a connection on checkout
+
+    closed/broken connections are caught without a round trip, connections that sat
+    idle for a while (server restart, idle timeouts) also get a SELECT 1
+    """
+    if conn.closed or conn.get_transaction_status() == pg_ext.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < DB_POOL_PING_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except pg.Error:
+        return False
+
+@contextmanager
+def db_connection():
+    """
+    borrow a healthy connection from the pool, it always goes back (rolled back) even on errors
+    """
+    if _pool is None:
+        init_pool()
+    if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise Exception("No database connection available, the pool is exhausted.")
+
+    conn = None
+    try:
+        for attempt in range(DB_POOL_MAX + 1):
+            conn = _pool.getconn()
+            if _is_healthy(conn):
+                break
+            _pool.putconn(conn, close=True) # drop it, the pool opens a fresh one
+            _last_used.pop(id(conn), None)
+            conn = None
+        if conn is None:
+            raise Exception("Could not get a healthy database connection.")
+
+        yield conn
+    finally:
+        if conn is not None:
+            broken = conn.closed != 0
+            if not broken:
+                try:
+                    conn.rollback() # never hand out a connection with an open transaction
+                except pg.Error:
+                    broken = True
+            if broken:
+                _last_used.pop(id(conn), None)
+            else:
+                _last_used[id(conn)] = time.monotonic()
+            _pool.putconn(conn, close=broken)
+        _pool_slots.release()
+
+async def init_async_pool():
+    """
+    create the async connection pool used by the API routes, called once at application startup
+    """
+    global _async_pool
+    if _async_pool is not None:
+        return
+    _async_pool = AsyncConnectionPool(
+        DATABASE_URL,
+        min_size=DB_POOL_MIN,
+        max_size=DB_POOL_MAX,
+        timeout=DB_POOL_TIMEOUT,
+        check=AsyncConnectionPool.check_connection, # health check on checkout
+        open=False,
+    )
+    await _async_pool.open(wait=True, timeout=300) # same patience as get_db_connection
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+
+def async_db_connection():
+    """
+    borrow a connection from the async pool (async context manager), it is returned
+    (and rolled back if needed) when the block exits, even on errors
+    """
+    return _async_pool.connection()
@@ -1,10 +1,36 @@
 from docx import Document
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.shared import RGBColor
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, Future
+from collections import deque, namedtuple
+import xml.etree.ElementTree as ET
+import zipfile
 import re
 import os
 
+BLUE = (0, 0, 255) # final text date in laws (RGBColor is a tuple so both engines compare equal)
+GRAY = (128, 128, 128) # original text in laws
+PARSER_VERSION = 2 # bump whenever the parsing rules change, invalidates the parse cache
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# the only paragraph properties the classification rules look at
+# size/color are taken from the first run, centered from the paragraph alignment
+Paragraph = namedtuple("Paragraph", ["text", "centered", "size", "color"])
+
+# Arabic spelling variants folded together for search (stored text keeps the original spelling)
+# tashkeel (fathatan .. sukun, superscript alef) and tatweel are dropped
+ARABIC_NORMALIZATION = str.maketrans({
+    **{chr(c): None for c in range(0x064B, 0x0653)},
+    "\u0670": None, # superscript alef
+    "\u0640": None, # tatweel
+    "\u0623": "\u0627", # alef with hamza above -> alef
+    "\u0625": "\u0627", # alef with hamza below -> alef
+    "\u0622": "\u0627", # alef with madda -> alef
+    "\u0671": "\u0627", # alef wasla -> alef
+    "\u0649": "\u064A", # alef maqsura -> ya
+    "\u0629": "\u0647", # taa marbuta -> ha
+})
+
 def extract_numeric(text):
     """
     helper function to extract numbers from text
@@ -25,22 +51,156 @@ def normalize_date_iso(value, format):
 
     return None
 
-def parse_docx_file(file_path, doc_type):
+def normalize_arabic(text):
     """
-    main docx parser
+    helper function to fold Arabic spelling variants (alef forms, alef maqsura, taa marbuta,
+    diacritics, tatweel), applied to the search columns at ingest and to search queries
+    """
+    if not text:
+        return text
+    return text.translate(ARABIC_NORMALIZATION)
+
+# citations of law articles in judgment/fatwa texts, matched on normalize_arabic() text
+# long form: "المادة (56) من القانون رقم (37) لسنة 1929", "المادة 829 من القانون المدني", "المادة (12) منه",
+# also with a proclitic: "والمادة", "بالمادة", "للمادة", "وللمادة"
+# short form (principles): "م 1/829 مدنى", "م 11 إثبات"
+CITATION_ARTICLE = re.compile(r"(?<!\w)[وف]?[بكل]?ا?لماده\s*\(?\s*(?P<first>\d+)\s*\)?(?:\s*/\s*(?P<second>\d+))?(?P<repeated>\s*مكرر\w*)?")
+CITATION_SHORT = re.compile(r"(?<!\w)م\s*(?P<first>\d+)(?:\s*/\s*(?P<second>\d+))?\s+(?P<code>\w+)(?!\w)")
+CITATION_SAME_LAW = re.compile(r"\s*(?:منه(?!\w)|من\s+(?:هذا|ذات)\s)")
+CITATION_FROM = re.compile(r"\s*من\s+")
+CITATION_LAW_NUMBER = re.compile(r"(?:رقم|القانون|بقانون)\s*\(?\s*(?P<number>\d+)\s*\)?\s*لسنه\s*(?P<year>\d{4})")
+CITATION_WINDOW = 90 # chars after "من" searched for the law number/year
+# well-known codes cited by name -> canonical name (normalized)
+LAW_NAMES = {
+    "القانون المدني": "القانون المدني",
+    "قانون الاثبات": "قانون الاثبات",
+    "قانون المرافعات": "قانون المرافعات",
+    "قانون العقوبات": "قانون العقوبات",
+    "قانون الاجراءات الجنائيه": "قانون الاجراءات الجنائيه",
+    "قانون التجاره": "قانون التجاره",
+    "القانون التجاري": "قانون التجاره",
+    "قانون السلطه القضائيه": "قانون السلطه القضائيه",
+    "الدستور": "الدستور",
+}
+# short form abbreviations -> canonical name
+LAW_CODES = {
+    "مدني": "القانون المدني",
+    "اثبات": "قانون الاثبات",
+    "مرافعات": "قانون المرافعات",
+    "عقوبات": "قانون العقوبات",
+    "تجاري": "قانون التجاره",
+}
+
+def canonical_law_name(name):
+    """
+    helper function to map a law name or abbreviation ("مدنى", "القانون المدنى") to the name stored in citations
+    """
+    name = normalize_arabic(name.strip())
+    if name in LAW_CODES:
+        return LAW_CODES[name]
+    for prefix, canonical in LAW_NAMES.items():
+        if name.startswith(prefix):
+            return canonical
+    return name
+
+def _article_and_paragraph(first, second):
+    """
+    helper function to order "a/b" references: "م 1/829" is paragraph 1 of article 829 while
+    "المادة 73/2" is paragraph 2 of article 73, paragraphs being small the larger number is the article
+    """
+    if second is None:
+        return int(first), None
+    a, b = int(first), int(second)
+    return (a, b) if a >= b else (b, a)
+
+def _original_offsets(text):
+    """
+    helper function to map normalize_arabic(text) back to `text`: the index in `text` of every
+    character kept by the normalization, plus len(text), so a match can be quoted as written
+    """
+    offsets = [i for i, char in enumerate(text) if char.translate(ARABIC_NORMALIZATION)]
+    offsets.append(len(text))
+    return offsets
+
+def _cited_law(text, pos, last_law):
+    """
+    helper function to resolve the law an article reference at `pos` belongs to,
+    returns ((law_number, law_year, law_name), end) or (None, pos)
+    """
+    m = CITATION_SAME_LAW.match(text, pos)
+    if m:
+        return last_law, m.end() if last_law else pos
+
+    m = CITATION_FROM.match(text, pos)
+    if not m:
+        return None, pos
+    start = m.end()
+    window = text[start:start + CITATION_WINDOW].split("الماده")[0] # stop at the next article
+
+    for prefix, canonical in LAW_NAMES.items():
+        if window.startswith(prefix):
+            return (None, None, canonical), start + len(prefix)
+
+    m = CITATION_LAW_NUMBER.search(window)
+    if m:
+        return (int(m.group("number")), int(m.group("year")), None), start + m.end()
+    return None, pos
+
+def extract_citations(texts):
+    """
+    helper function to find the law articles cited in some texts, returns a list of
+    {"article_number", "paragraph", "is_repeated", "law_number", "law_year", "law_name", "citation_text"}
+    (each distinct citation once, in order of appearance)
+
+    a cited law is either a number/year ("القانون رقم 14 لسنة 1939") or the canonical name of a
+    well-known code ("القانون المدني"), references without an identifiable law are skipped
+    """
+    citations = {}
+    for original in texts:
+        if not original:
+            continue
+        # matched on the normalized text, quoted from the original one
+        text = normalize_arabic(original)
+        last_law = None # "منه"/"من هذا القانون" refer back to the previously cited law
+        found = []
+
+        for m in CITATION_ARTICLE.finditer(text):
+            law, end = _cited_law(text, m.end(), last_law)
+            if law:
+                last_law = law
+                found.append((m.start(), m, law, end))
+
+        for m in CITATION_SHORT.finditer(text):
+            code = LAW_CODES.get(m.group("code"))
+            if code:
+                found.append((m.start(), m, (None, None, code), m.end()))
+
+        offsets = _original_offsets(original) if found else None
+        for start, m, law, end in sorted(found, key=lambda f: f[0]):
+            article_number, paragraph = _article_and_paragraph(m.group("first"), m.group("second"))
+            is_repeated = bool(m.groupdict().get("repeated"))
+            key = (article_number, paragraph, is_repeated, *law)
+            if key not in citations:
+                citations[key] = {
+                    "article_number": article_number,
+                    "paragraph": paragraph,
+                    "is_repeated": is_repeated,
+                    "law_number": law[0],
+                    "law_year": law[1],
+                    "law_name": law[2],
+                    "citation_text": " ".join(original[offsets[start]:offsets[end]].split())[:200],
+                }
+    return list(citations.values())
+
+def _docx_paragraphs(file_path):
+    """
+    helper function to read paragraphs through python-docx
     """
     document = Document(file_path)
 
     # for debugging and analysis
     # print(document._element.xml)
 
-    title = "" # title/main header info, inferred from style in judgments/fatwas
-    build_law_title = True # bool to keep building titles until first blue text in laws
-    header_text_pairs = {} # header/text for sections
-    current_header = None # to keep track of last header
-    current_subheader = None # to keep track of last subheader
-    size, color = None, None # text size/test color
-
     for paragraph in document.paragraphs:
         if not paragraph.text.strip():
             continue
@@ -48,12 +208,113 @@ def parse_docx_file(file_path, doc_type):
         if not paragraph.runs:
             continue
 
-        if paragraph.runs:
-            size, color = paragraph.runs[0].font.size, paragraph.runs[0].font.color.rgb        
+        font = paragraph.runs[0].font
+        yield Paragraph(paragraph.text, paragraph.alignment == WD_ALIGN_PARAGRAPH.CENTER, font.size, font.color.rgb)
+
+def _xml_run_text(run):
+    """
+    helper function to get the text of a <w:r> the same way python-docx does
+    """
+    text = ""
+    for child in run:
+        tag = child.tag
+        if tag == W_NS + "t":
+            text += child.text or ""
+        elif tag == W_NS + "tab" or tag == W_NS + "ptab":
+            text += "\t"
+        elif tag == W_NS + "br":
+            text += "\n" if child.get(W_NS + "type", "textWrapping") == "textWrapping" else ""
+        elif tag == W_NS + "cr":
+            text += "\n"
+        elif tag == W_NS + "noBreakHyphen":
+            text += "-"
+    return text
+
+def _xml_paragraph(p):
+    """
+    helper function to turn a body <w:p> element into a Paragraph, None if python-docx would skip it
+    """
+    text = ""
+    first_run = None
+    for child in p:
+        if child.tag == W_NS + "r":
+            if first_run is None:
+                first_run = child
+            text += _xml_run_text(child)
+        elif child.tag == W_NS + "hyperlink": # counts for text but not for runs
+            for run in child.iterfind(W_NS + "r"):
+                text += _xml_run_text(run)
+
+    if not text.strip() or first_run is None:
+        return None
+
+    jc = p.find(f"{W_NS}pPr/{W_NS}jc")
+    centered = jc is not None and jc.get(W_NS + "val") == "center"
+
+    size, color = None, None
+    rpr = first_run.find(W_NS + "rPr")
+    if rpr is not None:
+        sz = rpr.find(W_NS + "sz")
+        if sz is not None:
+            size = int(int(sz.get(W_NS + "val")) / 2.0 * 12700) # half-points to EMU, like docx.shared.Pt
+        rgb = rpr.find(W_NS + "color")
+        if rgb is not None and rgb.get(W_NS + "val") != "auto":
+            hex_value = rgb.get(W_NS + "val")
+            color = (int(hex_value[0:2], 16), int(hex_value[2:4], 16), int(hex_value[4:6], 16))
+
+    return Paragraph(text, centered, size, color)
+
+def _xml_paragraphs(file_path):
+    """
+    helper function to stream paragraphs straight out of word/document.xml
+
+    only top-level body paragraphs are used (same as document.paragraphs) and every
+    element is dropped once handled, so memory stays flat even for very long laws
+    """
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as stream:
+        depth = 0
+        body = None
+        for event, element in ET.iterparse(stream, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if depth == 2:
+                    body = element
+                continue
+
+            depth -= 1
+            if depth != 2: # <w:document> -> <w:body> -> paragraph/table
+                continue
+            if element.tag == W_NS + "p":
+                paragraph = _xml_paragraph(element)
+                if paragraph is not None:
+                    yield paragraph
+            body.remove(element)
+
+PARAGRAPH_READERS = {
+    "docx": _docx_paragraphs,
+    "xml": _xml_paragraphs,
+}
+
+def parse_docx_file(file_path, doc_type, engine="docx"):
+    """
+    main docx parser
+
+    engine "docx" reads the file through python-docx, engine "xml" streams the raw
+    word/document.xml instead (much faster, same output)
+    """
+    title = "" # title/main header info, inferred from style in judgments/fatwas
+    build_law_title = True # bool to keep building titles until first blue text in laws
+    header_text_pairs = {} # header/text for sections
+    current_header = None # to keep track of last header
+    current_subheader = None # to keep track of last subheader
+    size, color = None, None # text size/test color
+
+    for paragraph in PARAGRAPH_READERS[engine](file_path):
+        size, color = paragraph.size, paragraph.color
 
         # parsing based on doc_type
         if doc_type == "judgment":
-            if paragraph.alignment == WD_ALIGN_PARAGRAPH.CENTER: # centered text is a title
+            if paragraph.centered: # centered text is a title
                 title = paragraph.text if not title else title + " " + paragraph.text
                 continue
             if size == 177800: # header
@@ -74,7 +335,7 @@ def parse_docx_file(file_path, doc_type):
                     header_text_pairs[current_header] = paragraph.text
 
         elif doc_type == "fatwa":
-            if paragraph.alignment == WD_ALIGN_PARAGRAPH.CENTER: # centered text is a title
+            if paragraph.centered: # centered text is a title
                 title = paragraph.text if not title else title + " " + paragraph.text
                 continue
             if size == 177800: # header
@@ -87,7 +348,7 @@ def parse_docx_file(file_path, doc_type):
                 header_text_pairs[current_header] = paragraph.text
 
         elif doc_type == "law":
-            if not current_header and color == RGBColor(0, 0, 255): # build title until first blue text
+            if not current_header and color == BLUE: # build title until first blue text
                 build_law_title = False
                 continue
 
@@ -126,13 +387,13 @@ def parse_docx_file(file_path, doc_type):
                 elif not current_header or not current_subheader:
                     continue
 
-                elif paragraph.runs[0].font.color.rgb == RGBColor(0, 0, 255): # blue text is the final text date
+                elif color == BLUE: # blue text is the final text date
                     final_text_date_pattern = re.compile(r"\s+(?P<final_text_date>[\d/-]+)")
                     match = final_text_date_pattern.search(paragraph.text)
                     if match:
                         header_text_pairs[current_header][current_subheader]["final_text_date"] = normalize_date_iso(match.group("final_text_date"), "%d/%m/%Y")
 
-                elif paragraph.runs[0].font.color.rgb == RGBColor(128, 128, 128): # gray is the original text
+                elif color == GRAY: # gray is the original text
                     content = paragraph.text
                     if "النص الاصلى للمادة\n" in content:
                         content = content.replace("النص الاصلى للمادة\n", "")
@@ -220,17 +481,113 @@ def parse_docx_file(file_path, doc_type):
 
     # combine everything and return the final result
     final_result = {"doc_type": doc_type, "file_name": file_path.split("/")[-1]} | regex_result | header_text_pairs
+
+    # law articles cited anywhere in the sections/principles of judgments and fatwas
+    if doc_type in ("judgment", "fatwa"):
+        texts = [v for k, v in header_text_pairs.items() if isinstance(v, str)]
+        texts += list(final_result.get("principles", {}).values())
+        final_result["citations"] = extract_citations(texts)
+
     return final_result
 
-def parse_directory(dir_path, doc_type):
+def _parse_file_safe(file_path, doc_type, engine="docx"):
     """
-    run the docx parser over an entire directory
+    helper function to parse one file without raising, returns (result, error)
+    so that one broken file does not abort a whole batch
+    """
+    try:
+        return parse_docx_file(file_path, doc_type, engine), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def list_docx_files(dir_path):
+    """
+    helper function to list the .docx files of a directory in a stable (sorted) order
     """
-    results = []
-    for filename in os.listdir(dir_path):
+    file_paths = []
+    for filename in sorted(os.listdir(dir_path)):
         if not filename.endswith(".docx") or filename.startswith("~$"):
             continue
-        file_path = os.path.join(dir_path, filename)
-        res = parse_docx_file(file_path, doc_type)
-        results.append(res)
-    return results
\ No newline at end of file
+        file_paths.append(os.path.join(dir_path, filename))
+    return file_paths
+
+def _iter_outcomes(file_paths, doc_type, workers, engine, cache, hashes):
+    """
+    helper function to lazily yield (file_path, (result, error)) in file order
+
+    with workers > 1 at most 2 * workers files are in flight, so results never pile up
+    in memory when the consumer (e.g. database insertion) is slower than the parser
+    cache hits are served without opening the docx, fresh results are written back to the cache
+    `hashes` ({file_path: content hash}) spares hashing the files again for the cache keys
+    """
+    def cached(file_path):
+        if cache is None:
+            return None, None
+        key = cache.key(file_path, doc_type, (hashes or {}).get(file_path))
+        return key, cache.get(key, file_path)
+
+    def store(key, outcome):
+        if cache is not None and outcome[1] is None:
+            cache.put(key, outcome[0])
+        return outcome
+
+    if not workers or workers <= 1 or len(file_paths) <= 1:
+        for file_path in file_paths:
+            key, doc = cached(file_path)
+            if doc is not None:
+                yield file_path, (doc, None)
+            else:
+                yield file_path, store(key, _parse_file_safe(file_path, doc_type, engine))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def start(file_path):
+            key, doc = cached(file_path)
+            if doc is not None:
+                future = Future()
+                future.set_result((doc, None))
+                return file_path, None, future
+            return file_path, key, executor.submit(_parse_file_safe, file_path, doc_type, engine)
+
+        pending = deque()
+        paths = iter(file_paths)
+        for file_path in paths:
+            pending.append(start(file_path))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            file_path, key, future = pending.popleft()
+            next_path = next(paths, None)
+            if next_path is not None: # keep the pool busy while the consumer works on this result
+                pending.append(start(next_path))
+            outcome = future.result()
+            yield file_path, (store(key, outcome) if key is not None else outcome)
+
+def iter_files(file_paths, doc_type, workers=1, errors=None, engine="docx", cache=None, hashes=None):
+    """
+    stream parsed documents for the given files, in order, as soon as each one is ready
+
+    files that fail to parse are reported (and appended to `errors` as (file_path, message) if given) and skipped
+    `cache` is an optional parse_cache.ParseCache, `hashes` the already known {file_path: file_digest}
+    """
+    for file_path, (res, error) in _iter_outcomes(list(file_paths), doc_type, workers, engine, cache, hashes):
+        if error is not None:
+            print(f"Failed to parse {file_path}: {error}")
+            if errors is not None:
+                errors.append((file_path, error))
+            continue
+        yield res
+
+def iter_directory(dir_path, doc_type, workers=1, errors=None, engine="docx", cache=None):
+    """
+    streaming version of parse_directory, yields documents one by one in sorted file order
+    """
+    return iter_files(list_docx_files(dir_path), doc_type, workers=workers, errors=errors, engine=engine, cache=cache)
+
+def parse_directory(dir_path, doc_type, workers=1, errors=None, engine="docx", cache=None):
+    """
+    run the docx parser over an entire directory
+
+    workers > 1 spreads the files over a process pool, results keep the sorted file order either way
+    """
+    return list(iter_directory(dir_path, doc_type, workers=workers, errors=errors, engine=engine, cache=cache))
@@ -0,0 +1,762 @@
+from document_parser import iter_files, list_docx_files, normalize_arabic, PARSER_VERSION
+from parse_cache import ParseCache, file_digest
+from db import get_db_connection
+from psycopg2.extras import execute_values
+from contextlib import contextmanager
+from datetime import datetime
+import os
+
+JUDGMENT_DIR = "./example-samples/judgments/"
+FATWA_DIR = "./example-samples/fatwas/"
+LAW_DIR = "./example-samples/laws/"
+DOC_DIRS = {"judgment": JUDGMENT_DIR, "fatwa": FATWA_DIR, "law": LAW_DIR}
+PARSER_WORKERS = int(os.getenv("PARSER_WORKERS", "1")) # > 1 parses each directory with a process pool
+PARSER_ENGINE = os.getenv("PARSER_ENGINE", "xml") # "xml" streams word/document.xml, "docx" goes through python-docx
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "100")) # documents inserted per transaction
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", "./.parse-cache") # empty to disable the parse cache
+PARSE_CACHE_MAX_MB = int(os.getenv("PARSE_CACHE_MAX_MB", "512"))
+
+# progress of the current/last ingestion run in this process, served by /readyz
+INGEST_STATUS = {
+    "state": "idle", # idle -> running -> done | failed
+    "started_at": None,
+    "finished_at": None,
+    "current": None, # doc_type being synced
+    "files_total": 0, # new/changed files found so far
+    "files_done": 0, # of which already inserted
+    "stats": {},
+    "error": None,
+}
+
+CITATION_COLUMNS = [
+    "article_number", "paragraph", "is_repeated",
+    "law_number", "law_year", "law_name", "citation_text",
+]
+
+# how parsed documents map to tables
+# "key" columns identify an already stored document (same key -> reuse the row instead of inserting)
+# children are the related tables, "rows" turns one parsed document into their rows,
+# children with "search_fields" get a search_norm column and are part of the search_vector
+# "nested" describes how related rows are folded into the served document: one JSON object per
+# field, built from `key` -> `value` of the related rows in `order` (see document_json_sql)
+# "partition" is the date column whose decade partitions the main table and its children
+# (routed through the `decade` column, see database_schema.sql)
+INGEST_SPECS = {
+    "judgment": {
+        "main_table": "judgments",
+        "columns": [
+            "file_name", "court_name", "chamber_type",
+            "appeal_number", "judicial_year", "hearing_date",
+            "volume_number", "part_number", "page_number",
+            "rule_number", "reference_number",
+            "authority", "facts", "reasons",
+        ],
+        "key": ["file_name"],
+        "partition": "hearing_date",
+        # search_vector weights, principles are folded in with weight B
+        "search": {"A": ["court_name", "chamber_type"], "C": ["facts", "reasons"], "D": ["authority", "appeal_number"]},
+        # title/date of the document in the unified search_index
+        "index": {"title": ["court_name", "chamber_type", "appeal_number::text"], "date": "hearing_date"},
+        "nested": [
+            {
+                "field": "principles",
+                "table": "judgment_principles",
+                "key": "r.principle_number",
+                "value": "r.content",
+                "order": "r.principle_number",
+            },
+        ],
+        "children": [
+            {
+                "table": "judgment_principles",
+                "fk": "judgment_id",
+                "columns": ["principle_number", "content"],
+                "search_fields": ["content"],
+                "rows": lambda doc: [
+                    (num, text) for num, text in doc.get("principles", {}).items()
+                ],
+            },
+            {
+                "table": "judgment_citations",
+                "fk": "judgment_id",
+                "columns": CITATION_COLUMNS,
+                "rows": lambda doc: [
+                    tuple(c[col] for col in CITATION_COLUMNS) for c in doc.get("citations", [])
+                ],
+            },
+        ],
+    },
+    "fatwa": {
+        "main_table": "fatwas",
+        "columns": [
+            "file_name", "fatwa_number", "fatwa_date",
+            "hearing_date", "file_number",
+            "authority", "topic", "facts",
+            "application", "opinion",
+        ],
+        "key": ["fatwa_number", "fatwa_date"], # if same fatwa_number and fatwa_date, skip
+        "partition": "fatwa_date",
+        "search": {"A": ["topic"], "C": ["facts", "application", "opinion"], "D": ["authority"]},
+        "index": {"title": ["fatwa_number::text", "topic"], "date": "fatwa_date"},
+        "nested": [
+            {
+                "field": "principles",
+                "table": "fatwa_principles",
+                "key": "r.principle_number",
+                "value": "r.content",
+                "order": "r.principle_number",
+            },
+        ],
+        "children": [
+            {
+                "table": "fatwa_principles",
+                "fk": "fatwa_id",
+                "columns": ["principle_number", "content"],
+                "search_fields": ["content"],
+                "rows": lambda doc: [
+                    (num, text) for num, text in doc.get("principles", {}).items()
+                ],
+            },
+            {
+                "table": "fatwa_citations",
+                "fk": "fatwa_id",
+                "columns": CITATION_COLUMNS,
+                "rows": lambda doc: [
+                    tuple(c[col] for col in CITATION_COLUMNS) for c in doc.get("citations", [])
+                ],
+            },
+        ],
+    },
+    "law": {
+        "main_table": "laws",
+        "columns": [
+            "file_name", "law_number",
+            "issue_date", "publish_date",
+            "subject", "gazette",
+        ],
+        "key": ["file_name"],
+        "search": {"A": ["subject"], "D": ["gazette"]},
+        "index": {"title": ["law_number::text", "subject"], "date": "issue_date"},
+        "nested": [
+            {
+                "field": "articles",
+                "table": "law_articles",
+                # repeated articles are keyed N_repeated
+                "key": "CASE WHEN r.is_repeated THEN r.article_number || '_repeated' ELSE r.article_number::text END",
+                "value": """json_build_object(
+                    'is_repeated', r.is_repeated, 'original_text', r.original_text,
+                    'final_text', r.final_text, 'final_text_date', r.final_text_date
+                )""",
+                "order": "r.article_number, r.is_repeated",
+            },
+            {
+                "field": "promulgation_articles",
+                "table": "law_promulgation_articles",
+                "key": "r.article_number",
+                "value": """json_build_object(
+                    'original_text', r.original_text,
+                    'final_text', r.final_text, 'final_text_date', r.final_text_date
+                )""",
+                "order": "r.article_number",
+            },
+        ],
+        "children": [
+            {
+                "table": "law_articles",
+                "fk": "law_id",
+                "columns": ["article_number", "is_repeated", "original_text", "final_text", "final_text_date"],
+                "search_fields": ["final_text", "original_text"],
+                "rows": lambda doc: [
+                    (
+                        int(str(num).replace("_repeated", "")),
+                        article.get("repeated", False),
+                        article.get("original_text"),
+                        article.get("final_text"),
+                        article.get("final_text_date"),
+                    )
+                    for num, article in doc.get("articles", {}).items()
+                ],
+            },
+            {
+                "table": "law_promulgation_articles",
+                "fk": "law_id",
+                "columns": ["article_number", "original_text", "final_text", "final_text_date"],
+                "search_fields": ["final_text", "original_text"],
+                "rows": lambda doc: [
+                    (
+                        int(str(num)),
+                        article.get("original_text"),
+                        article.get("final_text"),
+                        article.get("final_text_date"),
+                    )
+                    for num, article in doc.get("promulgation_articles", {}).items()
+                ],
+            },
+        ],
+    },
+}
+
+STAGE_PAGE_SIZE = 1000 # rows per multi-row INSERT into the staging tables
+SEARCH_CONFIG = "arabic" # text search configuration for search_vector and the queries against it
+SNAPSHOT_VERSION = 1 # bump when document_json_sql changes, stored snapshots are then rebuilt
+INGEST_LOCK_ID = 7120 # Postgres advisory lock held while ingesting (any process)
+
+def _search_texts(spec, doc):
+    """
+    helper function to get the normalized text of a document per search weight, e.g. {"A": ..., "C": ...}
+    """
+    texts = {}
+    for weight, fields in spec["search"].items():
+        values = [str(doc[f]) for f in fields if doc.get(f) not in (None, "")]
+        texts[weight] = normalize_arabic(" ".join(values))
+    return texts
+
+def searchable_children(spec):
+    """
+    helper function to get the children whose text is searchable (principles/articles, not citations)
+    """
+    return [child for child in spec["children"] if "search_fields" in child]
+
+def child_columns(child):
+    """
+    helper function to get the stored columns of a child table (search_norm included if searchable)
+    """
+    return child["columns"] + (["search_norm"] if "search_fields" in child else [])
+
+def decade_sql(date_column):
+    """
+    helper function to build the partition key of a row: the decade of its date (e.g. 1990),
+    0 for documents without a date
+    """
+    return f"coalesce(extract(decade FROM {date_column})::int * 10, 0)"
+
+def partition_name(table, decade):
+    return f"{table}_{decade}s" if decade else f"{table}_undated"
+
+def create_partitions(cur, doc_type, decades):
+    """
+    helper function to create the missing decade partitions of a partitioned document type
+    (main table and children), so new rows always have a partition to be routed to
+    """
+    spec = INGEST_SPECS[doc_type]
+    for table in [spec["main_table"]] + [child["table"] for child in spec["children"]]:
+        for decade in decades:
+            name = partition_name(table, decade)
+            cur.execute("SELECT to_regclass(%s)", (name,))
+            if cur.fetchone()[0] is None:
+                cur.execute(f"""
+                    CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table}
+                    FOR VALUES FROM ({decade}) TO ({decade + 10})
+                """)
+
+def search_vector_sql(doc_type, main_alias="m", stage_alias="s"):
+    """
+    helper function to build the weighted tsvector expression of one document row
+
+    weights come from INGEST_SPECS["search"] (A = title-like fields ... D = least relevant) and
+    are read from the normalized per-weight text staged for the document (stage_main.norm_<weight>),
+    the normalized text of all principles/articles (search_norm) is folded in with weight B
+    """
+    spec = INGEST_SPECS[doc_type]
+    same_partition = f" AND c.decade = {main_alias}.decade" if "partition" in spec else ""
+    parts = []
+    for weight in spec["search"]:
+        parts.append((weight, f"coalesce({stage_alias}.norm_{weight.lower()}, '')"))
+    for child in searchable_children(spec):
+        parts.append(("B", f"""coalesce((
+            SELECT string_agg(c.search_norm, ' ')
+            FROM {child["table"]} c WHERE c.{child["fk"]} = {main_alias}.id{same_partition}
+        ), '')"""))
+    parts.sort(key=lambda p: p[0])
+    return " || ".join(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', {text}), '{weight}')" for weight, text in parts
+    )
+
+def document_json_sql(doc_type, fields=None, limits=None):
+    """
+    helper function to build the expression serializing one main row `m` (with its related rows
+    nested) to JSON text, so documents are assembled by Postgres: in the same query as the
+    search for /documents, once per document at ingest for the snapshots
+
+    `fields` restricts the columns/nested collections (None = everything), `limits` caps the
+    nested collections, e.g. {"articles": 5} keeps the first 5 articles
+    """
+    spec = INGEST_SPECS[doc_type]
+    limits = limits or {}
+    same_partition = " AND r.decade = m.decade" if "partition" in spec else ""
+    columns = [c for c in spec["columns"] if fields is None or c in fields]
+    parts = [f"'{column}', m.{column}" for column in ["id"] + columns]
+    for nested in spec["nested"]:
+        if fields is not None and nested["field"] not in fields:
+            continue
+        related = f"""{nested["table"]} r WHERE r.{doc_type}_id = m.id{same_partition}"""
+        if nested["field"] in limits:
+            related = f"""(
+                SELECT * FROM {related} ORDER BY {nested["order"]} LIMIT {int(limits[nested["field"]])}
+            ) r"""
+        # json (not jsonb) keeps the keys in aggregation order
+        parts.append(f"""'{nested["field"]}', coalesce((
+            SELECT json_object_agg({nested["key"]}, {nested["value"]} ORDER BY {nested["order"]})
+            FROM {related}
+        ), '{{}}')""")
+    return f"json_build_object({', '.join(parts)})::text"
+
+def ingest_batch(cur, doc_type, docs):
+    """
+    insert a batch of parsed documents of one type with a handful of set-based statements
+
+    1. stage the documents and their principles/articles into temp tables (multi-row inserts),
+       together with their Arabic-normalized search text (computed once per document here)
+    2. resolve ids: documents whose key already exists reuse that row, the first new document
+       per key gets a fresh id from the table sequence, later duplicates in the batch share it
+    3. insert the new main rows and all child rows from the staging tables, partitioned types
+       get the decade of their date (creating the partition if needed) and their children
+       follow the document into the same decade
+    4. (re)compute the search_vector and the snapshot of every touched document
+
+    the staging tables are dropped on commit, so the caller commits once per batch
+    """
+    spec = INGEST_SPECS[doc_type]
+    main_table = spec["main_table"]
+    columns = spec["columns"]
+    cols = ", ".join(columns)
+    weights = list(spec["search"])
+    norm_cols = ", ".join(f"norm_{w.lower()}" for w in weights)
+    partition = spec.get("partition")
+    decade = ", decade" if partition else ""
+
+    # ---- STAGE ----
+    cur.execute(f"""
+        CREATE TEMP TABLE stage_main ON COMMIT DROP AS
+        SELECT NULL::INT AS seq, NULL::INT AS doc_id, NULL::INT AS decade, FALSE AS is_new, {cols}, search_norm,
+               {", ".join(f"NULL::TEXT AS norm_{w.lower()}" for w in weights)}
+        FROM {main_table} WITH NO DATA
+    """)
+    rows = []
+    for seq, doc in enumerate(docs):
+        texts = _search_texts(spec, doc)
+        search_norm = "\n".join(text for text in texts.values() if text)
+        rows.append((seq, *[doc.get(c) for c in columns], search_norm, *[texts[w] for w in weights]))
+    execute_values(
+        cur,
+        f"INSERT INTO stage_main (seq, {cols}, search_norm, {norm_cols}) VALUES %s",
+        rows,
+        page_size=STAGE_PAGE_SIZE,
+    )
+
+    for idx, child in enumerate(spec["children"]):
+        child_cols = ", ".join(child_columns(child))
+        cur.execute(f"""
+            CREATE TEMP TABLE stage_child_{idx} ON COMMIT DROP AS
+            SELECT NULL::INT AS seq, {child_cols}
+            FROM {child["table"]} WITH NO DATA
+        """)
+        if "search_fields" in child:
+            search_idx = [child["columns"].index(f) for f in child["search_fields"]]
+            rows = [
+                (seq, *row, normalize_arabic(" ".join(row[i] for i in search_idx if row[i])))
+                for seq, doc in enumerate(docs) for row in child["rows"](doc)
+            ]
+        else:
+            rows = [(seq, *row) for seq, doc in enumerate(docs) for row in child["rows"](doc)]
+        if rows:
+            execute_values(
+                cur,
+                f"INSERT INTO stage_child_{idx} (seq, {child_cols}) VALUES %s",
+                rows,
+                page_size=STAGE_PAGE_SIZE,
+            )
+
+    # ---- RESOLVE IDS ----
+    key_match = " AND ".join(f"m.{k} = s.{k}" for k in spec["key"])
+    key_cols = ", ".join(spec["key"])
+    key_is_null = " OR ".join(f"{k} IS NULL" for k in spec["key"])
+
+    # already stored documents
+    cur.execute(f"""
+        UPDATE stage_main s SET doc_id = m.id{", decade = m.decade" if partition else ""}
+        FROM {main_table} m
+        WHERE {key_match}
+    """)
+
+    # first occurrence of every new key (a NULL key never matches anything, same as `=` above)
+    cur.execute(f"""
+        UPDATE stage_main SET doc_id = nextval(pg_get_serial_sequence('{main_table}', 'id')), is_new = TRUE
+            {f", decade = {decade_sql(partition)}" if partition else ""}
+        WHERE seq IN (
+            SELECT seq FROM (
+                SELECT seq, {key_cols},
+                       row_number() OVER (PARTITION BY {key_cols} ORDER BY seq) AS rn
+                FROM stage_main
+                WHERE doc_id IS NULL
+            ) firsts
+            WHERE rn = 1 OR {key_is_null}
+        )
+    """)
+
+    # later duplicates inside the batch
+    cur.execute(f"""
+        UPDATE stage_main s SET doc_id = m.doc_id, decade = m.decade
+        FROM stage_main m
+        WHERE s.doc_id IS NULL AND m.is_new AND {key_match}
+    """)
+
+    # ---- INSERT ----
+    if partition:
+        cur.execute("SELECT DISTINCT decade FROM stage_main WHERE is_new")
+        create_partitions(cur, doc_type, [row[0] for row in cur.fetchall()])
+
+    cur.execute(f"""
+        INSERT INTO {main_table} (id{decade}, {cols}, search_norm)
+        SELECT doc_id{decade}, {cols}, search_norm FROM stage_main WHERE is_new ORDER BY seq
+    """)
+
+    for idx, child in enumerate(spec["children"]):
+        columns = child_columns(child)
+        cur.execute(f"""
+            INSERT INTO {child["table"]} ({child["fk"]}{decade}, {", ".join(columns)})
+            SELECT s.doc_id{", s.decade" if partition else ""}, {", ".join(f"c.{c}" for c in columns)}
+            FROM stage_child_{idx} c
+            JOIN stage_main s ON s.seq = c.seq
+            ON CONFLICT DO NOTHING
+        """)
+
+    # ---- SEARCH ----
+    # staged duplicates of a stored document (same key, possibly different text) did not
+    # overwrite it, so their search text is taken from the stored row instead
+    search_fields = [f for fields in spec["search"].values() for f in fields]
+    cur.execute(f"""
+        SELECT s.seq, {", ".join(f"m.{f}" for f in search_fields)}
+        FROM stage_main s
+        JOIN {main_table} m ON m.id = s.doc_id{" AND m.decade = s.decade" if partition else ""}
+        WHERE s.is_new IS NOT TRUE
+    """)
+    stored = []
+    for seq, *values in cur.fetchall():
+        texts = _search_texts(spec, dict(zip(search_fields, values)))
+        stored.append((seq, *[texts[w] for w in weights]))
+    if stored:
+        execute_values(cur, f"""
+            UPDATE stage_main s SET {", ".join(f"norm_{w.lower()} = v.norm_{w.lower()}" for w in weights)}
+            FROM (VALUES %s) AS v (seq, {norm_cols})
+            WHERE s.seq = v.seq
+        """, stored, page_size=STAGE_PAGE_SIZE)
+
+    cur.execute(f"""
+        UPDATE {main_table} m SET search_vector = {search_vector_sql(doc_type)}
+        FROM (
+            SELECT DISTINCT ON (doc_id) * FROM stage_main ORDER BY doc_id, seq
+        ) s
+        WHERE m.id = s.doc_id{" AND m.decade = s.decade" if partition else ""}
+    """)
+    index_documents(cur, doc_type, "m.id IN (SELECT doc_id FROM stage_main)")
+    snapshot_documents(cur, doc_type, "m.id IN (SELECT doc_id FROM stage_main)")
+
+def index_documents(cur, doc_type, where):
+    """
+    helper function to copy the search_vector/title/date of the documents matching `where` into
+    the unified search_index (one row per document of any type, deleted along with the document)
+    """
+    spec = INGEST_SPECS[doc_type]
+    fk = f"{doc_type}_id"
+    decade = ", decade" if "partition" in spec else ""
+    title = ", ".join(f"m.{field}" for field in spec["index"]["title"])
+    cur.execute(f"""
+        INSERT INTO search_index (doc_type, {fk}{decade}, title, doc_date, search_vector)
+        SELECT %s, m.id{", m.decade" if decade else ""}, concat_ws(' - ', {title}), m.{spec["index"]["date"]}, m.search_vector
+        FROM {spec["main_table"]} m
+        WHERE {where}
+        ON CONFLICT ({fk}) DO UPDATE
+        SET title = EXCLUDED.title, doc_date = EXCLUDED.doc_date, search_vector = EXCLUDED.search_vector
+    """, (doc_type,))
+    return cur.rowcount
+
+def snapshot_documents(cur, doc_type, where):
+    """
+    helper function to store the assembled JSON of the documents matching `where` (exactly what
+    /documents returns for them) in document_snapshots, served as is by /documents/{type}/{id}
+    """
+    spec = INGEST_SPECS[doc_type]
+    fk = f"{doc_type}_id"
+    decade = ", decade" if "partition" in spec else ""
+    cur.execute(f"""
+        INSERT INTO document_snapshots (doc_type, {fk}{decade}, version, document)
+        SELECT %s, m.id{", m.decade" if decade else ""}, %s, {document_json_sql(doc_type)}::json
+        FROM {spec["main_table"]} m
+        WHERE {where}
+        ON CONFLICT ({fk}) DO UPDATE
+        SET version = EXCLUDED.version, document = EXCLUDED.document
+    """, (doc_type, SNAPSHOT_VERSION))
+    return cur.rowcount
+
+def bump_corpus_version(cur):
+    """
+    helper function to tell the API result caches that the stored documents changed
+    (commits together with the change)
+    """
+    cur.execute("UPDATE corpus_version SET version = version + 1")
+
+@contextmanager
+def ingest_lock(conn):
+    """
+    hold the ingestion advisory lock on `conn` for the duration of the block, so runs from
+    different threads/processes (startup ingestion, `python -m ingest`, uploads) never overlap
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (INGEST_LOCK_ID,))
+    conn.commit()
+    try:
+        yield conn
+    finally:
+        if not conn.closed:
+            conn.rollback()
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (INGEST_LOCK_ID,))
+            conn.commit()
+
+def batched(iterable, size):
+    """
+    helper function to group an iterable into lists of at most `size` items
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def plan_directory(cur, doc_type, dir_path, file_paths=None):
+    """
+    compare the files on disk with the ingestion manifest
+    `file_paths` restricts the comparison to these files of the directory (None = all .docx files),
+    a listed file that is gone counts as removed
+
+    returns (to_ingest, to_delete, touched, stats):
+    - to_ingest: {file_path: (size, mtime, hash)} of new/changed files
+    - to_delete: file names whose rows must go (changed or removed files)
+    - touched: {file_name: (size, mtime, hash)} of files with new size/mtime but the same content
+    only files whose size/mtime changed are hashed, files ingested by another PARSER_VERSION
+    count as changed (e.g. new fields extracted by the parser)
+    """
+    if file_paths is None:
+        cur.execute("""
+            SELECT file_name, file_size, mtime, content_hash, parser_version
+            FROM ingest_manifest WHERE doc_type = %s
+        """, (doc_type,))
+        file_paths = list_docx_files(dir_path)
+    else:
+        cur.execute("""
+            SELECT file_name, file_size, mtime, content_hash, parser_version
+            FROM ingest_manifest WHERE doc_type = %s AND file_name = ANY(%s)
+        """, (doc_type, [file_path.split("/")[-1] for file_path in file_paths]))
+        file_paths = [file_path for file_path in file_paths if os.path.exists(file_path)]
+    manifest = {row[0]: (row[1], row[2], row[3].strip(), row[4]) for row in cur.fetchall()}
+
+    to_ingest = {}
+    to_delete = set()
+    touched = {}
+    stats = {"new": 0, "changed": 0, "removed": 0, "unchanged": 0}
+    on_disk = set()
+
+    for file_path in file_paths:
+        file_name = file_path.split("/")[-1]
+        on_disk.add(file_name)
+        stat = os.stat(file_path)
+        old = manifest.get(file_name)
+        if old and old[3] != PARSER_VERSION:
+            to_ingest[file_path] = (stat.st_size, stat.st_mtime, file_digest(file_path))
+            to_delete.add(file_name)
+            stats["changed"] += 1
+            continue
+        if old and old[0] == stat.st_size and old[1] == stat.st_mtime:
+            stats["unchanged"] += 1
+            continue
+
+        content_hash = file_digest(file_path)
+        if old and old[2] == content_hash:
+            touched[file_name] = (stat.st_size, stat.st_mtime, content_hash)
+            stats["unchanged"] += 1
+        elif old:
+            to_ingest[file_path] = (stat.st_size, stat.st_mtime, content_hash)
+            to_delete.add(file_name)
+            stats["changed"] += 1
+        else:
+            to_ingest[file_path] = (stat.st_size, stat.st_mtime, content_hash)
+            stats["new"] += 1
+
+    removed = set(manifest) - on_disk
+    to_delete |= removed
+    stats["removed"] = len(removed)
+
+    # files with the same key share one row (e.g. fatwas deduplicated by number/date, whatever
+    # their bytes), so when the file owning that row goes away the other files stored in it
+    # have to be ingested again (looked up by the row recorded in the manifest, these files
+    # need not be among the compared files)
+    if to_delete:
+        cur.execute(f"""
+            SELECT file_name, file_size, mtime, content_hash
+            FROM ingest_manifest WHERE doc_type = %s AND doc_id IN (
+                SELECT id FROM {INGEST_SPECS[doc_type]["main_table"]} WHERE file_name = ANY(%s)
+            )
+        """, (doc_type, list(to_delete)))
+        for file_name, size, mtime, content_hash in sorted(cur.fetchall()):
+            file_path = os.path.join(dir_path, file_name)
+            if file_name in to_delete or file_path in to_ingest or not os.path.exists(file_path):
+                continue
+            to_ingest[file_path] = touched.pop(file_name, (size, mtime, content_hash.strip()))
+
+    return to_ingest, to_delete, touched, stats
+
+def sync_directory(conn, doc_type, dir_path, workers=1, engine="docx", cache=None, batch_size=100, status=None, errors=None, file_paths=None):
+    """
+    bring the database in line with one directory, doing work proportional to what changed
+    (only with the listed `file_paths` of the directory if given, see plan_directory)
+
+    rows of changed/removed files are deleted first (principles/articles cascade),
+    then new/changed files are parsed and inserted in batches, each batch committed
+    together with its manifest entries, so an interrupted run resumes where it stopped
+    `status` (e.g. INGEST_STATUS) gets its files_total/files_done counters updated
+    files that fail to parse are skipped (appended to `errors` as (file_path, message) if given)
+    """
+    spec = INGEST_SPECS[doc_type]
+    cur = conn.cursor()
+
+    to_ingest, to_delete, touched, stats = plan_directory(cur, doc_type, dir_path, file_paths)
+    if status is not None:
+        status["files_total"] += len(to_ingest)
+
+    if to_delete:
+        cur.execute(
+            f"DELETE FROM {spec['main_table']} WHERE file_name = ANY(%s)",
+            (list(to_delete),)
+        )
+        cur.execute(
+            "DELETE FROM ingest_manifest WHERE doc_type = %s AND file_name = ANY(%s)",
+            (doc_type, list(to_delete))
+        )
+        bump_corpus_version(cur)
+    if touched:
+        execute_values(cur, """
+            UPDATE ingest_manifest m SET file_size = t.file_size, mtime = t.mtime
+            FROM (VALUES %s) AS t (doc_type, file_name, file_size, mtime)
+            WHERE m.doc_type = t.doc_type AND m.file_name = t.file_name
+        """, [(doc_type, name, size, mtime) for name, (size, mtime, _) in touched.items()],
+            page_size=STAGE_PAGE_SIZE)
+    conn.commit()
+
+    file_info = {file_path.split("/")[-1]: info for file_path, info in to_ingest.items()}
+    # the content hashes from the plan double as parse cache keys (files are not hashed twice)
+    hashes = {file_path: info[2] for file_path, info in to_ingest.items()}
+    docs = iter_files(to_ingest.keys(), doc_type, workers=workers, errors=errors, engine=engine, cache=cache, hashes=hashes)
+    for batch in batched(docs, batch_size):
+        ingest_batch(cur, doc_type, batch)
+        # the row each file ended up in (its own, or the stored one of the same key)
+        cur.execute("SELECT file_name, doc_id FROM stage_main")
+        doc_ids = dict(cur.fetchall())
+        execute_values(cur, """
+            INSERT INTO ingest_manifest (doc_type, file_name, file_size, mtime, content_hash, parser_version, doc_id)
+            VALUES %s
+            ON CONFLICT (doc_type, file_name) DO UPDATE
+            SET file_size = EXCLUDED.file_size, mtime = EXCLUDED.mtime,
+                content_hash = EXCLUDED.content_hash, parser_version = EXCLUDED.parser_version,
+                doc_id = EXCLUDED.doc_id, ingested_at = now()
+        """, [
+            (doc_type, doc["file_name"], *file_info[doc["file_name"]], PARSER_VERSION, doc_ids[doc["file_name"]])
+            for doc in batch
+        ])
+        bump_corpus_version(cur)
+        conn.commit() # one transaction per batch
+        if status is not None:
+            status["files_done"] += len(batch)
+
+    cur.close()
+    print(f"Synced {doc_type}s: {stats['new']} new, {stats['changed']} changed, "
+          f"{stats['removed']} removed, {stats['unchanged']} unchanged")
+    return stats
+
+def run_ingestion():
+    """
+    create the schema if needed and sync every document directory into the database
+    """
+    INGEST_STATUS.update({
+        "state": "running",
+        "started_at": datetime.now().isoformat(),
+        "finished_at": None,
+        "files_total": 0,
+        "files_done": 0,
+        "stats": {},
+        "error": None,
+    })
+
+    try:
+        conn = get_db_connection()
+        conn.autocommit = True  # needed for create table
+        cur = conn.cursor()
+
+        # one ingestion at a time, other runs (e.g. uploads) wait here
+        with ingest_lock(conn):
+            # create tables and indices (idempotent, existing data is kept)
+            with open("database_schema.sql", "r", encoding="utf-8") as f:
+                sql = f.read()
+            cur.execute(sql)
+            conn.autocommit = False
+
+            # rows stored before the search columns existed are dropped together with their
+            # manifest entries, so the sync below re-ingests them (from the parse cache when possible)
+            for doc_type, spec in INGEST_SPECS.items():
+                # by row, so the files sharing it (same key) are re-ingested too
+                cur.execute(f"""
+                    DELETE FROM ingest_manifest WHERE doc_type = %s AND doc_id IN (
+                        SELECT id FROM {spec["main_table"]}
+                        WHERE search_norm IS NULL OR search_vector IS NULL
+                    )
+                """, (doc_type,))
+                cur.execute(f"""
+                    DELETE FROM {spec["main_table"]} WHERE search_norm IS NULL OR search_vector IS NULL
+                """)
+                if cur.rowcount:
+                    bump_corpus_version(cur)
+
+                # documents stored before the unified search_index existed
+                indexed = index_documents(cur, doc_type, f"""NOT EXISTS (
+                    SELECT 1 FROM search_index i WHERE i.{doc_type}_id = m.id
+                )""")
+                if indexed:
+                    bump_corpus_version(cur)
+
+                # documents without an up to date snapshot
+                snapshot_documents(cur, doc_type, f"""NOT EXISTS (
+                    SELECT 1 FROM document_snapshots s
+                    WHERE s.{doc_type}_id = m.id AND s.version = {SNAPSHOT_VERSION}
+                )""")
+            conn.commit()
+
+            cache = ParseCache(PARSE_CACHE_DIR, PARSE_CACHE_MAX_MB * 1024 * 1024) if PARSE_CACHE_DIR else None
+
+            # populate tables
+            # only new/changed/removed files are touched, tracked through the ingest_manifest table
+            # documents are streamed from the parser and inserted in bounded batches,
+            # so parsing and inserting overlap and memory does not grow with the corpus
+            for doc_type, dir_path in DOC_DIRS.items():
+                INGEST_STATUS["current"] = doc_type
+                INGEST_STATUS["stats"][doc_type] = sync_directory(
+                    conn, doc_type, dir_path,
+                    workers=PARSER_WORKERS, engine=PARSER_ENGINE,
+                    cache=cache, batch_size=INGEST_BATCH_SIZE,
+                    status=INGEST_STATUS
+                )
+
+            conn.commit()
+        cur.close()
+        conn.close()
+    except Exception as e:
+        INGEST_STATUS.update({"state": "failed", "error": str(e), "finished_at": datetime.now().isoformat()})
+        raise
+
+    INGEST_STATUS.update({"state": "done", "current": None, "finished_at": datetime.now().isoformat()})
+
+if __name__ == "__main__":
+    # python -m ingest
+    run_ingestion()
@@ -1,231 +1,498 @@
-from document_parser import parse_directory
-import psycopg2 as pg
-from fastapi import FastAPI, HTTPException
-import os
+from db import async_db_connection, init_async_pool, close_async_pool, close_pool
+from ingest import run_ingestion, document_json_sql, searchable_children, INGEST_STATUS, INGEST_SPECS, SEARCH_CONFIG
+from document_parser import normalize_arabic, canonical_law_name, ARABIC_NORMALIZATION
+from result_cache import ResultCache
+from uploads import UploadQueue, QueueFull, FileConflict, InvalidUpload
+from fastapi import FastAPI, HTTPException, Depends, File, UploadFile
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
+from psycopg.rows import dict_row
+from datetime import date
+import threading
 import time
+import base64
+import json
+import os
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-JUDGMENT_DIR = "./example-samples/judgments/"
-FATWA_DIR = "./example-samples/fatwas/"
-LAW_DIR = "./example-samples/laws/"
+INGEST_ON_STARTUP = os.getenv("INGEST_ON_STARTUP", "0") == "1" # run ingestion in a background thread when the API starts
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024")) # cached /documents responses per process, 0 to disable
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "300")) # seconds
+RESULT_CACHE_VERSION_CHECK = float(os.getenv("RESULT_CACHE_VERSION_CHECK", "1")) # seconds between corpus version lookups
+EXPORT_FETCH_SIZE = int(os.getenv("EXPORT_FETCH_SIZE", "500")) # rows per fetch from the /export server-side cursor
+MAX_ARTICLES_PER_LOOKUP = int(os.getenv("MAX_ARTICLES_PER_LOOKUP", "500")) # article numbers per /laws/.../articles call
+MAX_CITED_BY = int(os.getenv("MAX_CITED_BY", "1000")) # citing documents per /cited-by call (`limit` cap)
+REDIS_URL = os.getenv("REDIS_URL", "") # optional cache shared by all API processes, e.g. redis://localhost:6379/0
+UPLOAD_QUEUE_SIZE = int(os.getenv("UPLOAD_QUEUE_SIZE", "100")) # uploaded files waiting to be ingested, uploads beyond get a 503
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "20")) # queued files ingested together
+UPLOAD_RETRY_AFTER = int(os.getenv("UPLOAD_RETRY_AFTER", "5")) # seconds, Retry-After of a rejected upload
+# "filters" map the metadata filter parameters to columns (`_from`/`_to` are inclusive bounds)
+# "partition_date" is the date whose decade partitions the type (judgments/fatwas, see INGEST_SPECS)
+# "summary_columns" are the short columns returned by mode=ranked (long texts become a snippet)
+# "nested" describes how related rows are folded into a document (see INGEST_SPECS)
 TABLE_MAP = {
     "judgment": {
         "main_table": "judgments",
-        "main_text_fields": ["authority", "facts", "reasons"],
-        "related_table": "judgment_principles",
-        "related_text_fields": ["content"],
-        "join_key": "judgment_id"
+        "join_key": "judgment_id",
+        "citations_table": "judgment_citations",
+        "partition_date": "hearing_date",
+        "filters": {
+            "court_name": "court_name",
+            "chamber_type": "chamber_type",
+            "number": "appeal_number",
+            "judicial_year": "judicial_year",
+            "judicial_year_from": "judicial_year",
+            "judicial_year_to": "judicial_year",
+            "date_from": "hearing_date",
+            "date_to": "hearing_date",
+        },
+        "summary_columns": [
+            "file_name", "court_name", "chamber_type", "appeal_number", "judicial_year",
+            "hearing_date", "volume_number", "part_number", "page_number", "rule_number",
+            "reference_number",
+        ],
+        "nested": INGEST_SPECS["judgment"]["nested"],
     },
     "fatwa": {
         "main_table": "fatwas",
-        "main_text_fields": ["authority", "topic", "facts", "application", "opinion"],
-        "related_table": "fatwa_principles",
-        "related_text_fields": ["content"],
-        "join_key": "fatwa_id"
+        "join_key": "fatwa_id",
+        "citations_table": "fatwa_citations",
+        "partition_date": "fatwa_date",
+        "filters": {
+            "number": "fatwa_number",
+            "date_from": "fatwa_date",
+            "date_to": "fatwa_date",
+            "hearing_date_from": "hearing_date",
+            "hearing_date_to": "hearing_date",
+        },
+        "summary_columns": ["file_name", "fatwa_number", "fatwa_date", "hearing_date", "file_number", "topic"],
+        "nested": INGEST_SPECS["fatwa"]["nested"],
     },
     "law": {
-        "main_table": "law_articles",
-        "main_text_fields": ["original_text", "final_text"],
-        "related_tables": ["law_articles", "law_promulgation_articles"],
-        "related_text_fields": {
-            "law_articles": ["original_text", "final_text"],
-            "law_promulgation_articles": ["original_text", "final_text"]
+        "main_table": "laws",
+        "join_key": "law_id",
+        "summary_columns": ["file_name", "law_number", "issue_date", "publish_date", "subject", "gazette"],
+        "filters": {
+            "number": "law_number",
+            "date_from": "issue_date",
+            "date_to": "issue_date",
+            "publish_date_from": "publish_date",
+            "publish_date_to": "publish_date",
         },
-        "join_key": "law_id"
-    }
+        "nested": INGEST_SPECS["law"]["nested"],
+    },
 }
 
-def init_db():
-    conn = get_db_connection()
-    conn.autocommit = True  # needed for create table
-    cur = conn.cursor()
-
-    # create tables and indices
-    with open("database_schema.sql", "r", encoding="utf-8") as f:
-        sql = f.read()
-    cur.execute(sql)
-
-    # populate tables
-    # judgements
-    judgments = parse_directory(JUDGMENT_DIR, "judgment")
-
-    for doc in judgments:
-        cur.execute("""
-            SELECT id FROM judgments WHERE file_name = %s
-        """, (doc["file_name"],))
-        row = cur.fetchone()
+SEARCH_MODES = ["fts", "substring", "ranked"]
+# ts_rank_cd weights of the search_vector classes {D, C, B, A}: subject/topic (A) and
+# principles/articles (B) count more than facts (C) and the rest (D)
+RANK_WEIGHTS = "{0.1, 0.2, 0.4, 1.0}"
+SNIPPET_OPTIONS = "MaxFragments=2, MaxWords=25, MinWords=10, StartSel=<b>, StopSel=</b>, FragmentDelimiter=\" ... \""
+SNIPPET_ROWS = 3 # principles/articles of a hit (the first ones matching) its snippet is cut from
+# normalize_arabic() as arguments of SQL translate(): the folded letters, then the dropped ones
+NORMALIZE_FROM = "".join(chr(c) for c, v in ARABIC_NORMALIZATION.items() if v) + "".join(chr(c) for c, v in ARABIC_NORMALIZATION.items() if not v)
+NORMALIZE_TO = "".join(v for v in ARABIC_NORMALIZATION.values() if v)
+
+def related_tables(table_info):
+    """
+    helper function to get the related tables of any document type
+    """
+    return [nested["table"] for nested in table_info["nested"]]
+
+def partition_key(table_info, alias="m"):
+    """
+    helper function to select the partition key (decade) next to the id of partitioned types,
+    so later joins on the main table only probe the partition holding the document
+    """
+    return f", {alias}.decade" if "partition_date" in table_info else ""
+
+def same_partition(table_info, alias="r", main_alias="m"):
+    """
+    helper function to match rows of a partitioned type to the partition of their document
+    """
+    return f" AND {alias}.decade = {main_alias}.decade" if "partition_date" in table_info else ""
+
+def available_fields(type, mode):
+    """
+    helper function to list what `fields=` can select for a document type in a search mode
+    (id is always returned)
+    """
+    table_info = TABLE_MAP[type]
+    if mode == "ranked":
+        return table_info["summary_columns"] + ["rank", "snippet"]
+    return INGEST_SPECS[type]["columns"] + [nested["field"] for nested in table_info["nested"]]
+
+def summary_json_sql(type, fields=None):
+    """
+    helper function to build the expression serializing one ranked hit `m` to JSON text: the
+    summary columns, the rank and a highlighted snippet around the matches (instead of full texts)
+
+    the snippet is cut from the original text of the searchable fields and of the first SNIPPET_ROWS
+    principles/articles containing a query term (not all of them). the highlighted words are the
+    words of that text matching a query term once normalized, like the search itself matched them
+    `fields` restricts the columns/rank/snippet (None = everything)
+    """
+    table_info = TABLE_MAP[type]
+    spec = INGEST_SPECS[type]
+    columns = [c for c in table_info["summary_columns"] if fields is None or c in fields]
+    parts = [f"'{column}', m.{column}" for column in ["id"] + columns]
+    if fields is None or "rank" in fields:
+        parts.append("'rank', ids.rank")
+    if fields is None or "snippet" in fields:
+        # any of the query terms (a hit may match them across the document and several rows)
+        terms = """to_tsquery('simple', (
+            SELECT string_agg(DISTINCT quote_literal(t[1]), ' | ')
+            FROM regexp_matches(ids.tsq::text, '''([^'']+)''', 'g') t
+        ))"""
+        texts = [f"m.{f}" for weight_fields in spec["search"].values() for f in weight_fields] + [
+            f"""(SELECT string_agg(concat_ws(' ', {", ".join(f"r.{f}" for f in child["search_fields"])}), ' ' ORDER BY r.id)
+                FROM (
+                    SELECT * FROM {child["table"]} r
+                    WHERE r.{child["fk"]} = m.id{same_partition(table_info)}
+                      AND to_tsvector('{SEARCH_CONFIG}', r.search_norm) @@ s.terms
+                    ORDER BY r.id LIMIT {SNIPPET_ROWS}
+                ) r)"""
+            for child in searchable_children(spec)
+        ]
+        # 'simple' keeps the words as they are written, so the query lists the original words
+        words = f"""(SELECT to_tsquery('simple', string_agg(quote_literal(w.token), ' | '))
+            FROM (SELECT DISTINCT token FROM ts_parse('default', t.text)) w
+            WHERE to_tsvector('{SEARCH_CONFIG}', translate(w.token, '{NORMALIZE_FROM}', '{NORMALIZE_TO}')) @@ s.terms)"""
+        parts.append(f"""'snippet', (
+            SELECT ts_headline('simple', t.text, coalesce({words}, s.terms), '{SNIPPET_OPTIONS}')
+            FROM (SELECT {terms} AS terms) s,
+                 LATERAL (SELECT concat_ws(' ', {", ".join(texts)}) AS text) t
+        )""")
+    return f"json_build_object({', '.join(parts)})::text"
+
+def encode_cursor(last_id, rank=None):
+    """
+    helper function to turn the last returned id (and its rank in ranked mode) into an opaque cursor
+    """
+    position = {"id": last_id} if rank is None else {"id": last_id, "rank": rank}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """
+    helper function to get {"id": ..., "rank": ...} back from a cursor, None if it is malformed
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        return None
+    if not isinstance(position, dict) or not isinstance(position.get("id"), int):
+        return None
+    if not isinstance(position.get("rank", 0.0), (int, float)):
+        return None
+    return position
+
+def filter_conditions(table_info, filters, alias="m"):
+    """
+    helper function to turn validated filters ({param: value}) into SQL conditions on the main
+    table, returns (conditions, params)
+
+    a range on the partition date is also applied to the decade, so the planner prunes the
+    partitions outside the range
+    """
+    conditions, params = [], []
+    for param, value in (filters or {}).items():
+        column = table_info["filters"][param]
+        op = ">=" if param.endswith("_from") else "<=" if param.endswith("_to") else "="
+        conditions.append(f"{alias}.{column} {op} %s")
+        params.append(value)
+        if column == table_info.get("partition_date") and op != "=":
+            conditions.append(f"{alias}.decade {op} %s")
+            params.append(value.year // 10 * 10)
+    return conditions, params
+
+def build_search_query(table_info, q, mode, filters=None):
+    """
+    helper function to build the SQL selecting the ids of matching documents, returns (sql, params)
+
+    - fts: the precomputed search_vector (GIN index), which already contains the text of the
+      principles/articles, so no joins are needed
+    - substring: ILIKE '%q%' semantics, every table is probed on its own through the trigram
+      index of its search_norm column and the id sets are unioned (instead of one OR over a join)
+    both match against text normalized at ingest, so q gets the same normalization
+    metadata `filters` go into the same WHERE as the text predicate (B-tree indexes), so the
+    planner can narrow the rows down before any text is matched
+    """
+    main_table = table_info["main_table"]
+    q = normalize_arabic(q.strip())
+    conditions, filter_params = filter_conditions(table_info, filters)
+    key = partition_key(table_info)
+
+    if not q:
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return f"SELECT m.id{key} FROM {main_table} m {where}", filter_params
+
+    if mode == "fts":
+        conditions = conditions + [f"m.search_vector @@ websearch_to_tsquery('{SEARCH_CONFIG}', %s)"]
+        return f"""
+            SELECT m.id{key}
+            FROM {main_table} m
+            WHERE {" AND ".join(conditions)}
+        """, filter_params + [q]
+
+    # escape LIKE wildcards so q is matched literally
+    pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    selects = [f"SELECT m.id{key} FROM {main_table} m WHERE {' AND '.join(conditions + ['m.search_norm ILIKE %s'])}"]
+    params = filter_params + [pattern]
+    for rtable in related_tables(table_info):
+        # with filters the related rows are joined to their (filtered) document
+        join = f"JOIN {main_table} m ON m.id = r.{table_info['join_key']}{same_partition(table_info, 'm', 'r')}" if conditions else ""
+        selects.append(f"""
+            SELECT r.{table_info["join_key"]}{partition_key(table_info, "r")} FROM {rtable} r {join}
+            WHERE {" AND ".join(conditions + ["r.search_norm ILIKE %s"])}
+        """)
+        params += filter_params + [pattern]
+    return " UNION ".join(selects), params
+
+def build_ranked_query(table_info, q, filters=None):
+    """
+    helper function to build the SQL selecting (id, rank, tsq) of the documents matching q,
+    returns (sql, params)
+
+    same matching as fts (search_vector, GIN index), ranked with ts_rank_cd using RANK_WEIGHTS
+    """
+    conditions, params = filter_conditions(table_info, filters)
+    return f"""
+        SELECT m.id{partition_key(table_info)}, ts_rank_cd('{RANK_WEIGHTS}', m.search_vector, tsq) AS rank, tsq
+        FROM {table_info["main_table"]} m, websearch_to_tsquery('{SEARCH_CONFIG}', %s) tsq
+        WHERE {" AND ".join(["m.search_vector @@ tsq"] + conditions)}
+    """, [normalize_arabic(q.strip())] + params
+
+def document_filters(
+    court_name: str = None,
+    chamber_type: str = None,
+    number: int = None,
+    judicial_year: int = None,
+    judicial_year_from: int = None,
+    judicial_year_to: int = None,
+    date_from: date = None,
+    date_to: date = None,
+    hearing_date_from: date = None,
+    hearing_date_to: date = None,
+    publish_date_from: date = None,
+    publish_date_to: date = None
+):
+    """
+    metadata filter parameters shared by /documents and /export, returns the ones that are set
+    """
+    return {param: value for param, value in locals().items() if value is not None}
+
+def parse_filters(type, filters):
+    """
+    helper function to check that every filter exists for the document type
+    """
+    unsupported = set(filters) - set(TABLE_MAP[type]["filters"])
+    if unsupported:
+        raise HTTPException(
+            status_code=400,
+            detail=f"INVALID FILTERS {sorted(unsupported)} for type={type}. Choose from {list(TABLE_MAP[type]['filters'])}"
+        )
+    return filters
+
+result_cache = None
+if RESULT_CACHE_SIZE > 0 or REDIS_URL:
+    result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL, REDIS_URL)
+version_checked_at = 0.0
+upload_queue = UploadQueue(UPLOAD_QUEUE_SIZE, UPLOAD_BATCH_SIZE)
+
+@asynccontextmanager
+async def lifespan(app):
+    # the API serves right away, ingestion (if enabled) catches up in the background
+    # otherwise ingestion is run separately with `python -m ingest`
+    if INGEST_ON_STARTUP:
+        INGEST_STATUS["state"] = "running" # not ready until the thread is done
+        threading.Thread(target=run_ingestion, name="ingestion", daemon=True).start()
+    await init_async_pool()
+    upload_queue.start()
+    yield
+    upload_queue.stop()
+    if result_cache is not None:
+        await result_cache.close()
+    await close_async_pool()
+    close_pool() # only opened if something used the sync pool
+
+app = FastAPI(lifespan=lifespan)
+
+@app.get("/healthz")
+def healthz():
+    """
+    liveness: the process is up and serving
+    """
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    """
+    readiness: not ready while a startup ingestion is still running (or if it failed)
+    """
+    ready = INGEST_STATUS["state"] in ("idle", "done")
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "ingestion": INGEST_STATUS}
+    )
+
+@app.get("/cache/stats")
+def cache_stats():
+    """
+    hit/miss statistics of the /documents result cache
+    """
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.stats()}
+
+async def fetch_rows(query, params):
+    """
+    helper function to run one query on its own pooled connection and return dict rows
+    """
+    async with async_db_connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(query, params)
+            return await cur.fetchall()
+
+async def stream_rows(query, params, fetch_size):
+    """
+    helper function to stream the first column of every row through a named (server-side) cursor,
+    only `fetch_size` rows are held in memory at a time, on the API and on the database
+    """
+    async with async_db_connection() as conn:
+        async with conn.cursor(name="export") as cur:
+            await cur.execute(query, params)
+            while True:
+                rows = await cur.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield rows
+
+def json_response(body):
+    """
+    helper function to send an already serialized JSON body
+    """
+    return Response(content=body, media_type="application/json")
+
+async def refresh_corpus_version():
+    """
+    helper function to pick up the corpus version bumped by ingestion, looked up at most
+    every RESULT_CACHE_VERSION_CHECK seconds (a new version drops the cached results)
+    """
+    global version_checked_at
+    now = time.monotonic()
+    if now - version_checked_at < RESULT_CACHE_VERSION_CHECK:
+        return
+    version_checked_at = now
+    rows = await fetch_rows("SELECT version FROM corpus_version", None)
+    result_cache.set_version(rows[0]["version"] if rows else 0)
+
+async def search_documents(type, q, page, pageSize, mode, after, fields=None, limits=None, filters=None):
+    """
+    run the search and return the response body (JSON text)
+    """
+    table_info = TABLE_MAP[type]
+    main_table = table_info["main_table"]
 
-        if row:
-            judgment_id = row[0]
-        else:
-            cur.execute("""
-                INSERT INTO judgments (
-                    file_name, court_name, chamber_type,
-                    appeal_number, judicial_year, hearing_date,
-                    volume_number, part_number, page_number,
-                    rule_number, reference_number,
-                    authority, facts, reasons
-                ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                RETURNING id
-            """, (
-                doc.get("file_name"),
-                doc.get("court_name"),
-                doc.get("chamber_type"),
-                doc.get("appeal_number"),
-                doc.get("judicial_year"),
-                doc.get("hearing_date"),
-                doc.get("volume_number"),
-                doc.get("part_number"),
-                doc.get("page_number"),
-                doc.get("rule_number"),
-                doc.get("reference_number"),
-                doc.get("authority"),
-                doc.get("facts"),
-                doc.get("reasons"),
-            ))
-            judgment_id = cur.fetchone()[0]
-
-        # principles
-        for num, text in doc.get("principles", {}).items():
-            cur.execute("""
-                INSERT INTO judgment_principles
-                (judgment_id, principle_number, content)
-                VALUES (%s,%s,%s)
-                ON CONFLICT (judgment_id, principle_number) DO NOTHING
-            """, (judgment_id, num, text))
-
-    # fatwas
-    fatwas = parse_directory(FATWA_DIR, "fatwa")
-
-    for doc in fatwas:
-        cur.execute("""
-            SELECT id FROM fatwas WHERE fatwa_number = %s AND fatwa_date = %s
-        """, (doc["fatwa_number"], doc["fatwa_date"]),) # if same fatwa_number and fatwa_date, skip
-        row = cur.fetchone()
-
-        if row:
-            fatwa_id = row[0]
-        else:
-            cur.execute("""
-                INSERT INTO fatwas (
-                    file_name, fatwa_number, fatwa_date,
-                    hearing_date, file_number,
-                    authority, topic, facts,
-                    application, opinion
-                ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                RETURNING id
-            """, (
-                doc.get("file_name"),
-                doc.get("fatwa_number"),
-                doc.get("fatwa_date"),
-                doc.get("hearing_date"),
-                doc.get("file_number"),
-                doc.get("authority"),
-                doc.get("topic"),
-                doc.get("facts"),
-                doc.get("application"),
-                doc.get("opinion"),
-            ))
-            fatwa_id = cur.fetchone()[0]
-
-        # principles
-        for num, text in doc.get("principles", {}).items():
-            cur.execute("""
-                INSERT INTO fatwa_principles
-                (fatwa_id, principle_number, content)
-                VALUES (%s,%s,%s)
-                ON CONFLICT (fatwa_id, principle_number) DO NOTHING
-            """, (fatwa_id, num, text))
-
-    # laws
-    laws = parse_directory(LAW_DIR, "law")
-
-    for doc in laws:
-        cur.execute("""
-            SELECT id FROM laws WHERE file_name = %s
-        """, (doc["file_name"],))
-        row = cur.fetchone()
-
-        if row:
-            law_id = row[0]
-        else:
-            cur.execute("""
-                INSERT INTO laws (
-                    file_name, law_number,
-                    issue_date, publish_date,
-                    subject, gazette
-                ) VALUES (%s,%s,%s,%s,%s,%s)
-                RETURNING id
-            """, (
-                doc.get("file_name"),
-                doc.get("law_number"),
-                doc.get("issue_date"),
-                doc.get("publish_date"),
-                doc.get("subject"),
-                doc.get("gazette"),
-            ))
-            law_id = cur.fetchone()[0]
-
-        # articles
-        for num, article in doc.get("articles", {}).items():
-            cur.execute("""
-                INSERT INTO law_articles (
-                    law_id, article_number, is_repeated,
-                    original_text, final_text, final_text_date
-                ) VALUES (%s,%s,%s,%s,%s,%s)
-                ON CONFLICT (law_id, article_number, is_repeated) DO NOTHING
-            """, (
-                law_id,
-                int(str(num).replace("_repeated", "")),
-                article.get("repeated", False),
-                article.get("original_text"),
-                article.get("final_text"),
-                article.get("final_text_date"),
-            ))
-
-        # promulgation articles
-        for num, article in doc.get("promulgation_articles", {}).items():
-            cur.execute("""
-                INSERT INTO law_promulgation_articles (
-                    law_id, article_number,
-                    original_text, final_text, final_text_date
-                ) VALUES (%s,%s,%s,%s,%s)
-                ON CONFLICT (law_id, article_number) DO NOTHING
-            """, (
-                law_id,
-                int(str(num)),
-                article.get("original_text"),
-                article.get("final_text"),
-                article.get("final_text_date"),
-            ))
-
-    conn.commit()
-    cur.close()
-    conn.close()
-
-def get_db_connection():
-    for attempt in range(100):
-        try:
-            conn = pg.connect(DATABASE_URL)
-            print("Connected to Postgres!")
-            break
-        except pg.OperationalError:
-            print(f"Postgres not ready yet, retrying...")
-            time.sleep(3)
+    # one round trip: the page of ids, always in a stable order (id, or rank then id for
+    # ranked), joined back to the main rows which Postgres serializes itself (full documents
+    # with their principles/articles nested, or summaries with a snippet for ranked)
+    # with a cursor, page N+1 starts right after the last hit of page N (keyset pagination,
+    # same cost for every page), otherwise fall back to page/pageSize with OFFSET
+    if mode == "ranked":
+        hits_sql, params = build_ranked_query(table_info, q, filters)
+        columns, order = "ids.id, ids.rank", "rank DESC, id DESC"
+        after_sql, after_keys = "(rank, id) < (%s::real, %s)", ["rank", "id"]
+        document_sql = summary_json_sql(type, fields)
     else:
-        raise Exception("Could not connect to Postgres after several retries.")
-    conn = pg.connect(DATABASE_URL)
-    return conn
-
-app = FastAPI()
-init_db()
+        hits_sql, params = build_search_query(table_info, q, mode, filters)
+        columns, order = "ids.id", "id"
+        after_sql, after_keys = "id > %s", ["id"]
+        document_sql = document_json_sql(type, fields, limits)
+
+    if after is not None:
+        page_sql = f"SELECT * FROM ({hits_sql}) hits WHERE {after_sql} ORDER BY {order} LIMIT %s"
+        params = params + [after[key] for key in after_keys] + [pageSize + 1]
+    else:
+        page_sql = f"SELECT * FROM ({hits_sql}) hits ORDER BY {order} LIMIT %s OFFSET %s"
+        params = params + [pageSize + 1, (page - 1) * pageSize]
+    query = f"""
+        SELECT {columns}, {document_sql} AS doc
+        FROM ({page_sql}) ids
+        JOIN {main_table} m ON m.id = ids.id{same_partition(table_info, "ids")}
+        ORDER BY {order}
+    """
+
+    # one extra row tells whether there is a next page
+    rows = await fetch_rows(query, params)
+    next_cursor = None
+    if len(rows) > pageSize:
+        last = rows[pageSize - 1]
+        next_cursor = encode_cursor(last["id"], last.get("rank"))
+    docs = [row["doc"] for row in rows[:pageSize]]
+
+    # the documents are already JSON text, only the envelope is serialized here
+    envelope = json.dumps({
+        "page": page,
+        "pageSize": pageSize,
+        "returned": len(docs),
+        "next_cursor": next_cursor,
+    }, ensure_ascii=False)
+    return f'{envelope[:-1]}, "data": [{",".join(docs)}]}}'
+
+def parse_fields(type, mode, fields):
+    """
+    helper function to validate a sparse fieldset, e.g. fields=law_number,subject (only these are
+    fetched and serialized), returns the selected fields or None for everything
+    """
+    if not fields:
+        return None
+    allowed = available_fields(type, mode)
+    requested = {f.strip() for f in fields.split(",") if f.strip() and f.strip() != "id"}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"INVALID FIELDS {sorted(unknown)}. Choose from {allowed}"
+        )
+    return [f for f in allowed if f in requested]
+
+def parse_limits(principles_limit, articles_limit, promulgation_articles_limit):
+    """
+    helper function to validate the caps on the nested collections (ignored for types that do not have them)
+    """
+    limits = {}
+    for field, limit in [
+        ("principles", principles_limit),
+        ("articles", articles_limit),
+        ("promulgation_articles", promulgation_articles_limit),
+    ]:
+        if limit is not None:
+            if limit < 0:
+                raise HTTPException(status_code=400, detail=f"INVALID {field}_limit")
+            limits[field] = limit
+    return limits
+
+def check_paging(page, pageSize):
+    """
+    helper function to reject pages/page sizes below 1 (no rows to page through, negative OFFSET)
+    """
+    if page < 1:
+        raise HTTPException(status_code=400, detail="INVALID page, must be at least 1")
+    if pageSize < 1:
+        raise HTTPException(status_code=400, detail="INVALID pageSize, must be at least 1")
 
 @app.get("/documents")
-def get_documents(
+async def get_documents(
     type: str,
     q: str = "",
     page: int = 1,
-    pageSize: int = 10
+    pageSize: int = 10,
+    mode: str = "fts",
+    cursor: str = "",
+    fields: str = "",
+    principles_limit: int = None,
+    articles_limit: int = None,
+    promulgation_articles_limit: int = None,
+    filters: dict = Depends(document_filters)
 ):
     type = type.lower()
     if type not in TABLE_MAP:
@@ -233,140 +500,489 @@ def get_documents(
             status_code=400,
             detail="INVALID TYPE. Choose 'judgment', 'fatwa', or 'law'"
         )
+    mode = mode.lower()
+    if mode not in SEARCH_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail="INVALID MODE. Choose 'fts', 'substring' or 'ranked'"
+        )
+    if mode == "ranked" and not q.strip():
+        raise HTTPException(status_code=400, detail="q is required for mode=ranked")
+    check_paging(page, pageSize)
 
-    table_info = TABLE_MAP[type]
-    main_table = table_info["main_table"]
-    main_fields = table_info["main_text_fields"]
-    join_key = table_info["join_key"]
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if after is None or (mode == "ranked" and "rank" not in after):
+            raise HTTPException(status_code=400, detail="INVALID CURSOR")
 
-    offset = (page - 1) * pageSize
+    selected = parse_fields(type, mode, fields)
+    limits = parse_limits(principles_limit, articles_limit, promulgation_articles_limit)
+    filters = parse_filters(type, filters)
 
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
+        if result_cache is None:
+            return json_response(await search_documents(type, q, page, pageSize, mode, after, selected, limits, filters))
 
-        # if law -> two related tables
-        if type == "law":
-            related_tables = table_info["related_tables"]
-            related_fields_map = table_info["related_text_fields"]
-        else:
-            related_tables = [table_info["related_table"]]
-            related_fields_map = {table_info["related_table"]: table_info["related_text_fields"]}
-
-        # query
-        if q:
-            conditions = []
-            params = []
-
-            # main table conditions
-            main_conditions = " OR ".join([f"m.{field} ILIKE %s" for field in main_fields])
-            conditions.append(main_conditions)
-            params.extend([f"%{q}%"] * len(main_fields))
-
-            # related tables conditions
-            join_clauses = ""
-            for idx, rtable in enumerate(related_tables):
-                alias = f"r{idx}"
-                join_clauses += f" LEFT JOIN {rtable} {alias} ON m.id = {alias}.{join_key} "
-                rfields = related_fields_map[rtable]
-                rconds = " OR ".join([f"{alias}.{f} ILIKE %s" for f in rfields])
-                conditions.append(rconds)
-                params.extend([f"%{q}%"] * len(rfields))
-
-            query = f"""
-                SELECT DISTINCT m.id
-                FROM {main_table} m
-                {join_clauses}
-                WHERE {" OR ".join(conditions)}
-                LIMIT %s OFFSET %s
-            """
-            params.extend([pageSize, offset])
-        else:
-            query = f"SELECT id FROM {main_table} LIMIT %s OFFSET %s"
-            params = (pageSize, offset)
+        await refresh_corpus_version()
+        key = result_cache.key(
+            type, normalize_arabic(q.strip()), mode, page, pageSize, after, selected, limits,
+            {param: str(value) for param, value in filters.items()}
+        )
+        body = await result_cache.get(key)
+        if body is None:
+            body = await search_documents(type, q, page, pageSize, mode, after, selected, limits, filters)
+            await result_cache.put(key, body)
+        return json_response(body)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/documents/{type}/{doc_id}")
+async def get_document(type: str, doc_id: int):
+    """
+    one document by id, in the same shape as /documents, served from the snapshot written at
+    ingest (one primary key lookup, nothing assembled per request)
+    """
+    type = type.lower()
+    if type not in TABLE_MAP:
+        raise HTTPException(
+            status_code=400,
+            detail="INVALID TYPE. Choose 'judgment', 'fatwa', or 'law'"
+        )
+    rows = await fetch_rows(
+        "SELECT document::text AS doc FROM document_snapshots WHERE doc_type = %s AND doc_id = %s",
+        (type, doc_id)
+    )
+    if not rows:
+        raise HTTPException(status_code=404, detail="DOCUMENT NOT FOUND")
+    return json_response(rows[0]["doc"])
+
+@app.post("/uploads", status_code=202)
+def upload_documents(type: str, files: list[UploadFile] = File(...), replace: bool = False):
+    """
+    queue .docx files of one type for ingestion, returns the job to poll with GET /uploads/{job_id}
+
+    the files are stored and queued here, parsing and inserting happen in the background
+    (UploadQueue), a full queue answers 503 with Retry-After instead of waiting
+    file names that already exist answer 409 unless `replace` is set
+    """
+    type = type.lower()
+    if type not in TABLE_MAP:
+        raise HTTPException(
+            status_code=400,
+            detail="INVALID TYPE. Choose 'judgment', 'fatwa', or 'law'"
+        )
+    if len(files) > UPLOAD_QUEUE_SIZE:
+        raise HTTPException(status_code=413, detail=f"TOO MANY FILES, at most {UPLOAD_QUEUE_SIZE} per upload")
+
+    names = [os.path.basename(f.filename or "") for f in files]
+    invalid = [name for name in names if not name.endswith(".docx") or name.startswith("~$")]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"NOT .docx FILES: {invalid}")
+    if len(set(names)) != len(names):
+        raise HTTPException(status_code=400, detail="DUPLICATE FILE NAMES")
 
-        cur.execute(query, params)
-        main_ids = [row[0] for row in cur.fetchall()]
+    try:
+        job_id = upload_queue.submit(type, [(name, f.file) for name, f in zip(names, files)], replace)
+    except FileConflict as e:
+        raise HTTPException(status_code=409, detail=f"FILES ALREADY EXIST, set replace=true to replace them: {e.names}")
+    except InvalidUpload as e:
+        raise HTTPException(status_code=400, detail=f"NOT .docx FILES: {e.names}")
+    except QueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="UPLOAD QUEUE FULL, retry later",
+            headers={"Retry-After": str(UPLOAD_RETRY_AFTER)}
+        )
+    return upload_queue.status(job_id)
+
+@app.get("/uploads/{job_id}")
+def get_upload(job_id: str):
+    """
+    progress of an upload job: state (queued, running, done), counters and per-file errors
+    """
+    job = upload_queue.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="JOB NOT FOUND")
+    return job
+
+@app.get("/export")
+async def export_documents(
+    type: str,
+    q: str = "",
+    mode: str = "fts",
+    after_id: int = 0,
+    fields: str = "",
+    principles_limit: int = None,
+    articles_limit: int = None,
+    promulgation_articles_limit: int = None,
+    filters: dict = Depends(document_filters)
+):
+    """
+    stream every matching document (same filters and fields as /documents) as newline-delimited
+    JSON, ordered by id, in one response
+    an interrupted export resumes with after_id = the last id received
+    """
+    type = type.lower()
+    if type not in TABLE_MAP:
+        raise HTTPException(
+            status_code=400,
+            detail="INVALID TYPE. Choose 'judgment', 'fatwa', or 'law'"
+        )
+    mode = mode.lower()
+    if mode not in ["fts", "substring"]:
+        raise HTTPException(
+            status_code=400,
+            detail="INVALID MODE. Choose 'fts' or 'substring'"
+        )
 
-        if not main_ids:
-            return {"page": page, "pageSize": pageSize, "returned": 0, "data": []}
+    selected = parse_fields(type, mode, fields)
+    limits = parse_limits(principles_limit, articles_limit, promulgation_articles_limit)
+    filters = parse_filters(type, filters)
 
-        # ---- FETCH MAIN ROWS ----
-        cur.execute(
-            f"SELECT * FROM {main_table} WHERE id = ANY(%s)",
-            (main_ids,)
+    table_info = TABLE_MAP[type]
+    search_sql, params = build_search_query(table_info, q, mode, filters)
+    query = f"""
+        SELECT {document_json_sql(type, selected, limits)}
+        FROM ({search_sql}) ids
+        JOIN {table_info["main_table"]} m ON m.id = ids.id{same_partition(table_info, "ids")}
+        WHERE m.id > %s
+        ORDER BY m.id
+    """
+
+    async def lines():
+        async for rows in stream_rows(query, params + [after_id], EXPORT_FETCH_SIZE):
+            yield "".join(row[0] + "\n" for row in rows)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def parse_article_numbers(numbers, repeated):
+    """
+    helper function to parse article numbers like "829" or "829_repeated" (only when `repeated`,
+    i.e. for law_articles) into (article_number, is_repeated) pairs
+    """
+    pairs = []
+    for number in numbers.split(","):
+        number = number.strip()
+        if not number:
+            continue
+        is_repeated = repeated and number.endswith("_repeated")
+        number = number[:-len("_repeated")] if is_repeated else number
+        if not number.isdigit():
+            raise HTTPException(status_code=400, detail=f"INVALID ARTICLE NUMBER {number!r}")
+        pairs.append((int(number), is_repeated))
+    if not pairs:
+        raise HTTPException(status_code=400, detail="numbers is required")
+    if len(pairs) > MAX_ARTICLES_PER_LOOKUP:
+        raise HTTPException(
+            status_code=400,
+            detail=f"TOO MANY ARTICLES. At most {MAX_ARTICLES_PER_LOOKUP} per call"
         )
-        main_columns = [desc[0] for desc in cur.description]
-        main_rows = [dict(zip(main_columns, row)) for row in cur.fetchall()]
-
-        results = []
-
-        # ---- NEST RELATED DATA ----
-        if type in ["judgment", "fatwa"]:
-            rtable = table_info["related_table"]
-            rfields = table_info["related_text_fields"]
-            cur.execute(
-                f"SELECT * FROM {rtable} WHERE {join_key} = ANY(%s) ORDER BY principle_number",
-                (main_ids,)
-            )
-            related_columns = [desc[0] for desc in cur.description]
-            related_rows = [dict(zip(related_columns, row)) for row in cur.fetchall()]
-
-            related_map = {}
-            for r in related_rows:
-                pid = r[join_key]
-                if pid not in related_map:
-                    related_map[pid] = {}
-                related_map[pid][r["principle_number"]] = r["content"]
-
-            for m in main_rows:
-                m["principles"] = related_map.get(m["id"], {})
-                results.append(m)
-
-        elif type == "law":
-            # articles
-            cur.execute(
-                f"SELECT * FROM law_articles WHERE law_id = ANY(%s) ORDER BY article_number",
-                (main_ids,)
-            )
-            article_rows = [dict(zip([desc[0] for desc in cur.description], row)) for row in cur.fetchall()]
-
-            # promulgation articles
-            cur.execute(
-                f"SELECT * FROM law_promulgation_articles WHERE law_id = ANY(%s) ORDER BY article_number",
-                (main_ids,)
-            )
-            prom_rows = [dict(zip([desc[0] for desc in cur.description], row)) for row in cur.fetchall()]
-
-            articles_map = {}
-            prom_map = {}
-            for a in article_rows:
-                lid = a["law_id"]
-                if lid not in articles_map:
-                    articles_map[lid] = {}
-                key = f"{a['article_number']}_repeated" if a.get("is_repeated") else a["article_number"]
-                articles_map[lid][key] = {k: v for k, v in a.items() if k not in ["id", "law_id", "article_number"]}
-
-            for p in prom_rows:
-                lid = p["law_id"]
-                if lid not in prom_map:
-                    prom_map[lid] = {}
-                prom_map[lid][p["article_number"]] = {k: v for k, v in p.items() if k not in ["id", "law_id", "article_number"]}
-
-            for m in main_rows:
-                m["articles"] = articles_map.get(m["id"], {})
-                m["promulgation_articles"] = prom_map.get(m["id"], {})
-                results.append(m)
-
-        cur.close()
-        conn.close()
-
-        return {
+    return pairs
+
+def laws_where(law_number, year):
+    """
+    helper function to select laws by number (law numbers restart every year, `year` narrows
+    them down to the one issued that year), returns (sql, params)
+    """
+    if year is None:
+        return "m.law_number = %s", [law_number]
+    if not 1 <= year <= 9999:
+        raise HTTPException(status_code=400, detail="INVALID year, must be between 1 and 9999")
+    return "m.law_number = %s AND m.issue_date >= make_date(%s, 1, 1) AND m.issue_date < make_date(%s + 1, 1, 1)", \
+        [law_number, year, year]
+
+async def lookup_articles(field, law_number, year, pairs):
+    """
+    fetch the requested articles of every law with `law_number` in one query, each law comes with
+    its metadata, the found articles (keyed like /documents) and the requested keys that do not exist
+    """
+    table_info = TABLE_MAP["law"]
+    nested = next(n for n in table_info["nested"] if n["field"] == field)
+    where, params = laws_where(law_number, year)
+
+    # the requested numbers are joined in as an array, one unique index probe per article
+    if field == "articles":
+        match = """JOIN unnest(%s::int[], %s::bool[]) AS w(article_number, is_repeated)
+            ON r.article_number = w.article_number AND r.is_repeated = w.is_repeated"""
+        match_params = [[n for n, _ in pairs], [rep for _, rep in pairs]]
+    else:
+        match = "JOIN unnest(%s::int[]) AS w(article_number) ON r.article_number = w.article_number"
+        match_params = [[n for n, _ in pairs]]
+
+    rows = await fetch_rows(f"""
+        SELECT m.id, m.law_number, m.issue_date, m.publish_date, m.subject, m.gazette, coalesce((
+            SELECT json_object_agg({nested["key"]}, {nested["value"]} ORDER BY {nested["order"]})
+            FROM {nested["table"]} r {match}
+            WHERE r.law_id = m.id
+        ), '{{}}') AS {field}
+        FROM laws m
+        WHERE {where}
+        ORDER BY m.issue_date, m.id
+    """, match_params + params)
+
+    requested = [f"{n}_repeated" if rep else str(n) for n, rep in pairs]
+    for row in rows:
+        row["missing"] = [key for key in dict.fromkeys(requested) if key not in row[field]]
+    return rows
+
+@app.get("/laws/{law_number}")
+async def get_law(
+    law_number: int,
+    year: int = None,
+    fields: str = "",
+    articles_limit: int = None,
+    promulgation_articles_limit: int = None
+):
+    """
+    the law(s) with this number, same format, fields and limits as /documents?type=law
+    """
+    selected = parse_fields("law", "fts", fields)
+    limits = parse_limits(None, articles_limit, promulgation_articles_limit)
+    where, params = laws_where(law_number, year)
+    rows = await fetch_rows(f"""
+        SELECT {document_json_sql("law", selected, limits)} AS doc
+        FROM laws m
+        WHERE {where}
+        ORDER BY m.issue_date, m.id
+    """, params)
+    if not rows:
+        raise HTTPException(status_code=404, detail="LAW NOT FOUND")
+    return json_response(f'{{"returned": {len(rows)}, "data": [{",".join(row["doc"] for row in rows)}]}}')
+
+@app.get("/laws/{law_number}/articles")
+async def get_law_articles(law_number: int, numbers: str, year: int = None):
+    """
+    batch article lookup, e.g. numbers=1,2,829_repeated
+    """
+    rows = await lookup_articles("articles", law_number, year, parse_article_numbers(numbers, True))
+    if not rows:
+        raise HTTPException(status_code=404, detail="LAW NOT FOUND")
+    return {"returned": len(rows), "data": rows}
+
+@app.get("/laws/{law_number}/articles/{article}")
+async def get_law_article(law_number: int, article: str, year: int = None):
+    """
+    one article, e.g. /laws/6/articles/829 or /laws/6/articles/829_repeated
+    """
+    rows = await lookup_articles("articles", law_number, year, parse_article_numbers(article, True))
+    rows = [row for row in rows if row["articles"]]
+    if not rows:
+        raise HTTPException(status_code=404, detail="ARTICLE NOT FOUND")
+    return {"returned": len(rows), "data": rows}
+
+@app.get("/laws/{law_number}/promulgation_articles")
+async def get_law_promulgation_articles(law_number: int, numbers: str, year: int = None):
+    """
+    batch promulgation article lookup, e.g. numbers=1,2
+    """
+    rows = await lookup_articles("promulgation_articles", law_number, year, parse_article_numbers(numbers, False))
+    if not rows:
+        raise HTTPException(status_code=404, detail="LAW NOT FOUND")
+    return {"returned": len(rows), "data": rows}
+
+@app.get("/laws/{law_number}/promulgation_articles/{article}")
+async def get_law_promulgation_article(law_number: int, article: str, year: int = None):
+    """
+    one promulgation article, e.g. /laws/6/promulgation_articles/1
+    """
+    rows = await lookup_articles("promulgation_articles", law_number, year, parse_article_numbers(article, False))
+    rows = [row for row in rows if row["promulgation_articles"]]
+    if not rows:
+        raise HTTPException(status_code=404, detail="ARTICLE NOT FOUND")
+    return {"returned": len(rows), "data": rows}
+
+@app.get("/search")
+async def search_all(
+    q: str,
+    types: str = "",
+    page: int = 1,
+    pageSize: int = 10,
+    cursor: str = ""
+):
+    """
+    one ranked search over judgments, fatwas and laws at once (the unified search_index),
+    returns typed hits {type, id, title, date, rank}, full documents come from /documents
+    `types` narrows it down, e.g. types=judgment,fatwa
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="q is required")
+    doc_types = sorted({t.strip().lower() for t in types.split(",") if t.strip()}) or list(TABLE_MAP)
+    if set(doc_types) - set(TABLE_MAP):
+        raise HTTPException(
+            status_code=400,
+            detail="INVALID TYPES. Choose from 'judgment', 'fatwa', 'law'"
+        )
+    check_paging(page, pageSize)
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        if after is None or "rank" not in after:
+            raise HTTPException(status_code=400, detail="INVALID CURSOR")
+
+    async def run():
+        # same ranking as /documents?mode=ranked, one GIN probe for all types
+        # cursor ids are search_index ids (unique across types)
+        conditions = ["i.search_vector @@ tsq", "i.doc_type = ANY(%s)"]
+        params = [normalize_arabic(q.strip()), doc_types]
+        page_sql = f"""
+            SELECT i.id, i.doc_type, i.doc_id, i.title, i.doc_date,
+                   ts_rank_cd('{RANK_WEIGHTS}', i.search_vector, tsq) AS rank
+            FROM search_index i, websearch_to_tsquery('{SEARCH_CONFIG}', %s) tsq
+            WHERE {" AND ".join(conditions)}
+        """
+        if after is not None:
+            query = f"SELECT * FROM ({page_sql}) hits WHERE (rank, id) < (%s::real, %s) ORDER BY rank DESC, id DESC LIMIT %s"
+            params += [after["rank"], after["id"], pageSize + 1]
+        else:
+            query = f"SELECT * FROM ({page_sql}) hits ORDER BY rank DESC, id DESC LIMIT %s OFFSET %s"
+            params += [pageSize + 1, (page - 1) * pageSize]
+
+        rows = await fetch_rows(query, params)
+        next_cursor = None
+        if len(rows) > pageSize:
+            next_cursor = encode_cursor(rows[pageSize - 1]["id"], rows[pageSize - 1]["rank"])
+        data = [
+            {"type": r["doc_type"], "id": r["doc_id"], "title": r["title"], "date": r["doc_date"], "rank": r["rank"]}
+            for r in rows[:pageSize]
+        ]
+        return json.dumps({
             "page": page,
             "pageSize": pageSize,
-            "returned": len(results),
-            "data": results
-        }
+            "returned": len(data),
+            "next_cursor": next_cursor,
+            "data": data,
+        }, ensure_ascii=False, default=str)
+
+    try:
+        if result_cache is None:
+            return json_response(await run())
+
+        await refresh_corpus_version()
+        key = result_cache.key("search", normalize_arabic(q.strip()), doc_types, page, pageSize, after)
+        body = await result_cache.get(key)
+        if body is None:
+            body = await run()
+            await result_cache.put(key, body)
+        return json_response(body)
 
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+CITATION_TYPES = [type for type, table_info in TABLE_MAP.items() if "citations_table" in table_info]
+
+@app.get("/citations/{type}/{doc_id}")
+async def get_citations(type: str, doc_id: int):
+    """
+    the law articles cited by one judgment/fatwa
+    """
+    type = type.lower()
+    if type not in CITATION_TYPES:
+        raise HTTPException(status_code=400, detail="INVALID TYPE. Choose 'judgment' or 'fatwa'")
+    table_info = TABLE_MAP[type]
+    rows = await fetch_rows(f"""
+        SELECT m.id, coalesce((
+            SELECT json_agg(json_build_object(
+                'article_number', c.article_number, 'paragraph', c.paragraph,
+                'is_repeated', c.is_repeated, 'law_number', c.law_number, 'law_year', c.law_year,
+                'law_name', c.law_name, 'citation_text', c.citation_text
+            ) ORDER BY c.id)
+            FROM {table_info["citations_table"]} c WHERE c.{table_info["join_key"]} = m.id{same_partition(table_info, "c")}
+        ), '[]') AS citations
+        FROM {table_info["main_table"]} m
+        WHERE m.id = %s
+    """, (doc_id,))
+    if not rows:
+        raise HTTPException(status_code=404, detail="DOCUMENT NOT FOUND")
+    return rows[0]
+
+async def cited_by(article, law_number=None, year=None, law="", paragraph=None, type="", limit=100):
+    """
+    helper function to find the judgments/fatwas citing an article, returns the response body (JSON text)
+
+    the article is identified by its number ("829" or "829_repeated") and the law, either by
+    law_number (+ year) or by name (e.g. "القانون المدني" or "مدنى"), served from the citation indexes
+    """
+    if law_number is None and not law:
+        raise HTTPException(status_code=400, detail="law_number or law is required")
+    if type and type.lower() not in CITATION_TYPES:
+        raise HTTPException(status_code=400, detail="INVALID TYPE. Choose 'judgment' or 'fatwa'")
+    if not 1 <= limit <= MAX_CITED_BY:
+        raise HTTPException(status_code=400, detail=f"INVALID limit, must be between 1 and {MAX_CITED_BY}")
+    pairs = parse_article_numbers(article, True)
+    if len(pairs) > 1:
+        raise HTTPException(status_code=400, detail="ONE ARTICLE PER CALL")
+    article_number, is_repeated = pairs[0]
+
+    conditions = ["c.article_number = %s", "c.is_repeated = %s"]
+    params = [article_number, is_repeated]
+    if law_number is not None:
+        conditions.append("c.law_number = %s")
+        params.append(law_number)
+        if year is not None:
+            conditions.append("c.law_year = %s")
+            params.append(year)
+    else:
+        conditions.append("c.law_name = %s")
+        params.append(canonical_law_name(law))
+    if paragraph is not None:
+        conditions.append("c.paragraph = %s")
+        params.append(paragraph)
+
+    selects = []
+    for citing_type in CITATION_TYPES:
+        if type and type.lower() != citing_type:
+            continue
+        table_info = TABLE_MAP[citing_type]
+        columns = ", ".join(f"'{column}', m.{column}" for column in table_info["summary_columns"])
+        selects.append(f"""
+            SELECT '{citing_type}' AS type, m.id, json_build_object(
+                'type', '{citing_type}', 'id', m.id, {columns},
+                'citations', json_agg(json_build_object(
+                    'paragraph', c.paragraph, 'citation_text', c.citation_text
+                ) ORDER BY c.id)
+            )::text AS doc
+            FROM {table_info["citations_table"]} c
+            JOIN {table_info["main_table"]} m ON m.id = c.{table_info["join_key"]}{same_partition(table_info, "c")}
+            WHERE {" AND ".join(conditions)}
+            GROUP BY m.id, m.decade
+        """)
+    try:
+        rows = await fetch_rows(
+            f"SELECT doc FROM ({' UNION ALL '.join(selects)}) hits ORDER BY type, id LIMIT %s",
+            params * len(selects) + [limit]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return f'{{"returned": {len(rows)}, "data": [{",".join(row["doc"] for row in rows)}]}}'
+
+@app.get("/cited-by")
+async def get_cited_by(
+    article: str,
+    law_number: int = None,
+    year: int = None,
+    law: str = "",
+    paragraph: int = None,
+    type: str = "",
+    limit: int = 100
+):
+    """
+    the judgments/fatwas citing an article, e.g. /cited-by?article=829&law=مدنى
+    or /cited-by?article=56&law_number=37&year=1929
+    """
+    return json_response(await cited_by(article, law_number, year, law, paragraph, type, limit))
+
+@app.get("/laws/{law_number}/articles/{article}/cited-by")
+async def get_law_article_cited_by(
+    law_number: int,
+    article: str,
+    year: int = None,
+    paragraph: int = None,
+    type: str = "",
+    limit: int = 100
+):
+    """
+    the judgments/fatwas citing an article of a numbered law, e.g. /laws/14/articles/73/cited-by?year=1939
+    """
+    return json_response(await cited_by(article, law_number, year, "", paragraph, type, limit))
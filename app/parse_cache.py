@@ -0,0 +1,110 @@
+from document_parser import PARSER_VERSION
+import hashlib
+import pickle
+import zlib
+import os
+
+def file_digest(file_path):
+    """
+    helper function to hash the content of a file (sha256 hex digest)
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ParseCache:
+    """
+    on-disk cache of parse_docx_file results
+
+    entries are keyed by the file content hash + doc_type + PARSER_VERSION, so renaming
+    a file still hits and changing the parsing rules (bumping PARSER_VERSION) misses.
+    values are zlib-compressed pickles of the parsed dict (pickle keeps the int keys of
+    principles/articles, which json would turn into strings).
+    when the cache grows over max_bytes, the least recently used entries are evicted.
+    """
+
+    SUFFIX = ".pkl.z"
+
+    def __init__(self, cache_dir, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self._entries())
+
+    def key(self, file_path, doc_type, content_hash=None):
+        """
+        `content_hash` is the file_digest of the file when the caller already has it (no re-read)
+        """
+        return f"{PARSER_VERSION}-{doc_type}-{content_hash or file_digest(file_path)}"
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + self.SUFFIX)
+
+    def _entries(self):
+        """
+        helper function to list (path, size, last_used) of every cache entry
+        """
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(self.SUFFIX):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key, file_path):
+        """
+        return the cached document for `key` (with file_name set from `file_path`) or None
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                doc = pickle.loads(zlib.decompress(f.read()))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception: # corrupted/truncated entry, drop it and re-parse
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        os.utime(path) # mtime doubles as "last used" for eviction
+        self.hits += 1
+        # same content can live under several file names
+        doc["file_name"] = file_path.split("/")[-1]
+        return doc
+
+    def put(self, key, doc):
+        path = self._path(key)
+        data = zlib.compress(pickle.dumps(doc, protocol=pickle.HIGHEST_PROTOCOL))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path) # atomic, readers never see a half-written entry
+        self.total_bytes += len(data)
+
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        remove least recently used entries until the cache is back under 90% of max_bytes
+        """
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        self.total_bytes = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if self.total_bytes <= target:
+                break
+            self._remove(path)
+            self.total_bytes -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,111 @@
+from collections import OrderedDict
+import json
+import time
+
+try:
+    import redis.asyncio as aioredis
+except ImportError: # optional, only needed for a shared cache (REDIS_URL)
+    aioredis = None
+
+class ResultCache:
+    """
+    cache of serialized /documents responses
+
+    an in-process LRU (max_entries, each entry expires after ttl seconds), optionally backed
+    by a redis shared between API workers. keys carry the corpus version (bumped by ingestion,
+    see set_version), so once the corpus changes older entries are never served again: the
+    in-process LRU is cleared and the redis entries become unreachable until their ttl runs out.
+    """
+
+    PREFIX = "documents:"
+
+    def __init__(self, max_entries=1024, ttl=300, redis_url=""):
+        if redis_url and aioredis is None:
+            raise RuntimeError("REDIS_URL is set but the redis package is not installed")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.redis = aioredis.from_url(redis_url) if redis_url else None
+        self.entries = OrderedDict() # key -> (expires_at, body), least recently used first
+        self.version = None
+        self.hits = 0
+        self.shared_hits = 0 # of which served by redis
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def set_version(self, version):
+        """
+        switch to a new corpus version, dropping everything cached for the previous one
+        """
+        if version != self.version:
+            if self.version is not None:
+                self.invalidations += 1
+            self.entries.clear()
+            self.version = version
+
+    def key(self, *parts):
+        return f"{self.version}:{json.dumps(parts, ensure_ascii=False)}"
+
+    async def get(self, key):
+        """
+        return the cached body for `key` or None
+        """
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self.entries[key] # expired
+
+        if self.redis is not None:
+            try:
+                body = await self.redis.get(self.PREFIX + key)
+            except Exception: # the shared cache is best effort, fall back to Postgres
+                body = None
+            if body is not None:
+                body = body.decode()
+                self._store(key, body)
+                self.hits += 1
+                self.shared_hits += 1
+                return body
+
+        self.misses += 1
+        return None
+
+    async def put(self, key, body):
+        self._store(key, body)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.PREFIX + key, body, ex=self.ttl)
+            except Exception:
+                pass
+
+    def _store(self, key, body):
+        if self.max_entries <= 0:
+            return
+        self.entries[key] = (time.monotonic() + self.ttl, body)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "shared": self.redis is not None,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.aclose()
@@ -0,0 +1,283 @@
+from ingest import sync_directory, ingest_lock, DOC_DIRS, PARSER_WORKERS, PARSER_ENGINE, INGEST_BATCH_SIZE, PARSE_CACHE_DIR, PARSE_CACHE_MAX_MB
+from document_parser import iter_files
+from parse_cache import ParseCache
+from db import db_connection
+from collections import OrderedDict
+from datetime import datetime
+import threading
+import shutil
+import queue
+import zipfile
+import uuid
+import os
+
+UPLOAD_STAGING_DIR = ".uploads" # per type directory (in DOC_DIRS) holding uploads until the worker takes them
+
+def is_docx(file_path):
+    """
+    helper function to check that a file is a .docx archive (a zip with word/document.xml)
+    """
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            return "word/document.xml" in archive.namelist()
+    except (zipfile.BadZipFile, OSError):
+        return False
+
+class QueueFull(Exception):
+    """
+    the upload queue has no room for the files of an upload
+    """
+
+class FileConflict(Exception):
+    """
+    files of an upload already exist (or are queued) and replacing them was not asked for,
+    `names` lists them
+    """
+    def __init__(self, names):
+        super().__init__(f"files already exist: {names}")
+        self.names = names
+
+class InvalidUpload(Exception):
+    """
+    files of an upload are not .docx (zip) documents, `names` lists them
+    """
+    def __init__(self, names):
+        super().__init__(f"not .docx documents: {names}")
+        self.names = names
+
+class UploadQueue:
+    """
+    bounded queue of uploaded .docx files waiting to be ingested, drained by a background thread
+
+    uploads are staged under UPLOAD_STAGING_DIR of their type directory (ingest.DOC_DIRS), checked
+    to be .docx archives and queued file by file under a job id. the worker takes up to batch_size
+    queued files at a time, moves them next to the other documents of their type and syncs only
+    these files like the startup ingestion does (parsing over the PARSER_WORKERS process pool,
+    inserting in INGEST_BATCH_SIZE batches), holding the ingestion lock.
+    a file name that already exists is rejected (FileConflict) unless replacing was asked for,
+    a replacement is parsed before it takes the place of the stored file, so a broken upload
+    never costs the document it would have replaced.
+    at most max_files files are waiting at any time, an upload that does not fit is rejected
+    as a whole (QueueFull) so the caller can retry later instead of the backlog growing.
+    """
+
+    def __init__(self, max_files=100, batch_size=20, max_jobs=1000):
+        self.max_files = max_files
+        self.batch_size = batch_size
+        self.max_jobs = max_jobs
+        self.queue = queue.Queue() # (job_id, doc_type, file_name, replace), None stops the worker
+        self.pending = 0 # files accepted and not yet picked up by the worker
+        self.queued = set() # (doc_type, file_name) accepted and not yet ingested
+        self.jobs = OrderedDict() # job_id -> status, oldest first
+        self.lock = threading.Lock()
+        self.thread = None
+        self.cache = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="uploads", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread = None
+
+    def submit(self, doc_type, files, replace=False):
+        """
+        stage the uploaded files ([(file_name, file object)]) and queue them, returns the job id
+        `replace` allows files that already exist to be replaced
+
+        raises (nothing is stored or queued):
+        - QueueFull when the queue cannot take all of them
+        - FileConflict when some already exist without `replace`, or are queued by another job
+        - InvalidUpload when some are not .docx archives
+        """
+        dir_path = DOC_DIRS[doc_type]
+        keys = [(doc_type, file_name) for file_name, _ in files]
+        with self.lock:
+            taken = [name for _, name in keys if (doc_type, name) in self.queued]
+            if not replace:
+                taken += [name for _, name in keys if os.path.exists(os.path.join(dir_path, name))]
+            if taken:
+                raise FileConflict(sorted(set(taken)))
+            if self.pending + len(files) > self.max_files:
+                raise QueueFull()
+            self.pending += len(files)
+            self.queued.update(keys)
+
+        job_id = uuid.uuid4().hex
+        staging_path = os.path.join(dir_path, UPLOAD_STAGING_DIR, job_id)
+        try:
+            os.makedirs(staging_path)
+            invalid = []
+            for file_name, fileobj in files:
+                path = os.path.join(staging_path, file_name)
+                with open(path, "wb") as f:
+                    shutil.copyfileobj(fileobj, f)
+                if not is_docx(path):
+                    invalid.append(file_name)
+            if invalid:
+                raise InvalidUpload(invalid)
+        except Exception:
+            shutil.rmtree(staging_path, ignore_errors=True)
+            with self.lock:
+                self.pending -= len(files)
+                self.queued.difference_update(keys)
+            raise
+
+        with self.lock:
+            self.jobs[job_id] = {
+                "job_id": job_id,
+                "type": doc_type,
+                "state": "queued", # queued -> running -> done
+                "created_at": datetime.now().isoformat(),
+                "finished_at": None,
+                "files_total": len(files),
+                "files_done": 0,
+                "files_failed": 0,
+                "errors": {}, # file_name -> why it was not ingested
+            }
+            self._trim()
+        for file_name, _ in files:
+            self.queue.put((job_id, doc_type, file_name, replace))
+        return job_id
+
+    def status(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return None if job is None else dict(job, errors=dict(job["errors"]))
+
+    def stats(self):
+        with self.lock:
+            return {"pending": self.pending, "max_files": self.max_files, "jobs": len(self.jobs)}
+
+    def _trim(self):
+        """
+        helper function to forget the oldest finished jobs once there are more than max_jobs
+        """
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= self.max_jobs:
+                break
+            if self.jobs[job_id]["state"] == "done":
+                del self.jobs[job_id]
+
+    def _run(self):
+        """
+        worker loop: wait for queued files, then ingest whatever is queued (up to batch_size) at once
+        """
+        if PARSE_CACHE_DIR:
+            self.cache = ParseCache(PARSE_CACHE_DIR, PARSE_CACHE_MAX_MB * 1024 * 1024)
+        stop = False
+        while not stop:
+            items = []
+            item = self.queue.get()
+            while item is not None:
+                items.append(item)
+                if len(items) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            stop = item is None
+            if items:
+                with self.lock:
+                    self.pending -= len(items)
+                self._ingest(items)
+
+    def _ingest(self, items):
+        """
+        helper function to ingest a batch of queued files and record the outcome per file
+        """
+        with self.lock:
+            for job_id, _, _, _ in items:
+                if job_id in self.jobs:
+                    self.jobs[job_id]["state"] = "running"
+
+        by_type = {}
+        for job_id, doc_type, file_name, replace in items:
+            by_type.setdefault(doc_type, []).append((job_id, file_name, replace))
+
+        for doc_type, files in by_type.items():
+            try:
+                failed = self._ingest_files(doc_type, files)
+            except Exception as e: # the moved files stay in place, the next sync picks them up
+                failed = {(job_id, file_name): str(e) for job_id, file_name, _ in files}
+            finally:
+                for job_id, file_name, _ in files:
+                    staged = os.path.join(DOC_DIRS[doc_type], UPLOAD_STAGING_DIR, job_id, file_name)
+                    if os.path.exists(staged):
+                        os.remove(staged)
+                    try:
+                        os.rmdir(os.path.dirname(staged)) # once the last file of the job is done
+                    except OSError:
+                        pass
+
+            with self.lock:
+                for job_id, file_name, _ in files:
+                    self.queued.discard((doc_type, file_name))
+                    job = self.jobs.get(job_id)
+                    if job is None:
+                        continue
+                    if (job_id, file_name) in failed:
+                        job["files_failed"] += 1
+                        job["errors"][file_name] = failed[(job_id, file_name)]
+                    else:
+                        job["files_done"] += 1
+                    if job["files_done"] + job["files_failed"] == job["files_total"]:
+                        job["state"] = "done"
+                        job["finished_at"] = datetime.now().isoformat()
+
+    def _ingest_files(self, doc_type, files):
+        """
+        helper function to move the staged files of one type into place and sync only them,
+        returns {(job_id, file_name): why it was not ingested}
+
+        a file replacing an existing one is parsed first and left out if it cannot be, a new file
+        that cannot be parsed is removed again (otherwise every later sync would retry it)
+        """
+        dir_path = DOC_DIRS[doc_type]
+        failed = {}
+        replacing = {}
+        for job_id, file_name, replace in files:
+            staged = os.path.join(dir_path, UPLOAD_STAGING_DIR, job_id, file_name)
+            if os.path.exists(os.path.join(dir_path, file_name)):
+                if replace:
+                    replacing[staged] = (job_id, file_name)
+                else: # showed up since the upload was accepted
+                    failed[(job_id, file_name)] = "file already exists"
+
+        errors = []
+        for _ in iter_files(list(replacing), doc_type, workers=PARSER_WORKERS, errors=errors, engine=PARSER_ENGINE, cache=self.cache):
+            pass
+        for file_path, message in errors:
+            failed[replacing[file_path]] = f"could not be parsed: {message}"
+
+        created = set()
+        file_paths = []
+        for job_id, file_name, _ in files:
+            if (job_id, file_name) in failed:
+                continue
+            path = os.path.join(dir_path, file_name)
+            if not os.path.exists(path):
+                created.add(path)
+            os.replace(os.path.join(dir_path, UPLOAD_STAGING_DIR, job_id, file_name), path)
+            file_paths.append(path)
+        by_path = {os.path.join(dir_path, file_name): (job_id, file_name) for job_id, file_name, _ in files}
+
+        if not file_paths:
+            return failed
+        errors = []
+        with db_connection() as conn, ingest_lock(conn):
+            sync_directory(
+                conn, doc_type, dir_path,
+                workers=PARSER_WORKERS, engine=PARSER_ENGINE,
+                cache=self.cache, batch_size=INGEST_BATCH_SIZE,
+                errors=errors, file_paths=file_paths
+            )
+        for file_path, message in errors:
+            failed[by_path[file_path]] = f"could not be parsed: {message}"
+            if file_path in created: # never a file that was there before the upload
+                os.remove(file_path)
+        return failed